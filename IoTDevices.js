@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { fetchWithAuth, getIoTDeviceData, getDeviceSecurityAlerts } from '../utils/api';
 import './IoTDashboard.css';
 import MouseButtonHeatmap from '../components/MouseButtonHeatmap';
+import { decode } from '@msgpack/msgpack';
 
 // Separated Heatmap component
 const DeviceHeatmap = ({ deviceId }) => {
@@ -18,7 +19,7 @@ const DeviceHeatmap = ({ deviceId }) => {
         const response = await fetch(`http://localhost:5000/api/metrics/iot_heatmap/${deviceId}`, {
           headers: {
             'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json'
+            'Accept': 'application/msgpack'
           }
         });
 
@@ -26,8 +27,18 @@ const DeviceHeatmap = ({ deviceId }) => {
           throw new Error('Failed to fetch heatmap data');
         }
 
-        const data = await response.json();
-        setHeatmapData(data);
+        // MessagePack body; each grid is raw row-major uint8 bytes
+        const payload = decode(new Uint8Array(await response.arrayBuffer()));
+        const { width, height } = payload.resolution;
+        const toRows = (bytes) => {
+          const grid = new Uint8Array(bytes);
+          return Array.from({ length: height }, (_, y) => Array.from(grid.subarray(y * width, (y + 1) * width)));
+        };
+        setHeatmapData({
+          ...payload,
+          position_heatmap: toRows(payload.position_heatmap),
+          click_heatmap: toRows(payload.click_heatmap)
+        });
       } catch (err) {
         console.error('Error fetching heatmap data:', err);
         // Generate some dummy heatmap data if the API fails
@@ -370,7 +381,7 @@ const IoTDevices = ({ user }) => {
       console.error('Error fetching security alerts:', err);
       // Use fallback data on error
       setSecurityAlerts([{
-        timestamp: new Date().toISOString(),
+        ts: Date.now() * 1e6,
         event_type: 'attack_detected',
         details: {
           attack_type: 'ping_flood',
@@ -413,7 +424,7 @@ const IoTDevices = ({ user }) => {
     const status = getDeviceStatus();
     // Check for critical alerts in the last minute to determine attack status
     const hasRecentCriticalAlert = securityAlerts.some(alert => {
-      const alertTime = new Date(alert.timestamp);
+      const alertTime = new Date(alert.ts / 1e6);
       const now = new Date();
       const timeDiff = (now - alertTime) / 1000; // in seconds
       return alert.severity === 'critical' && timeDiff < 60;
@@ -597,7 +608,7 @@ const IoTDevices = ({ user }) => {
               {securityAlerts.slice().reverse().map((alert, index) => (
                 <tr key={index}>
                   <td style={{ padding: '12px 8px', borderBottom: '1px solid var(--border-color)' }}>
-                    {formatDate(alert.timestamp)}
+                    {formatDate(alert.ts / 1e6)}
                   </td>
                   <td style={{ padding: '12px 8px', borderBottom: '1px solid var(--border-color)' }}>
                     {formatEventType(alert.event_type)}
@@ -6,52 +6,86 @@ Enhanced with IoT device support and security alerts
 """
 
 import os
-import json
+import atexit
 import hmac
 import time
-import uuid
-import base64
 import hashlib
+import secrets
+import queue
 import logging
 import threading
-from datetime import datetime, timedelta
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
 
 from flask import Flask, request, jsonify, abort, render_template, Response, current_app
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
+import orjson
 
 # Import routes
 import routes.security
+import telemetry_tcp
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='server.log'
-)
+# Records are queued on the request thread and written to server.log by a
+# single background listener, so request handlers never block on file I/O
+log_queue = queue.Queue(maxsize=10000)
+log_file_handler = logging.FileHandler('server.log')
+log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = QueueListener(log_queue, log_file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.INFO)
+root_logger.addHandler(QueueHandler(log_queue))
 logger = logging.getLogger('server')
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Route jsonify and request.get_json through orjson"""
+    
+    # Naive datetimes in responses are UTC; numpy arrays serialize without tolist()
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+        
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 # Create Flask application
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Configure application
 app.config['SECRET_KEY'] = 'secure-esports-tracker-secret-key'
 app.config['DATABASE_PATH'] = os.getenv('DATABASE_PATH', 'secure_esports.db')
 app.config['JWT_KEY'] = 'secure-esports-tracker-jwt-key-for-development'  # FIXED: Static key for development
 app.config['CLIENT_SECRETS'] = {}  # Store client secrets (in memory for demonstration)
+app.config['AUTH_CACHE_ENABLED'] = os.getenv('AUTH_CACHE_ENABLED', '1') == '1'  # Cache successful password checks
+app.config['PROPAGATE_EXCEPTIONS'] = True  # Let the WSGI server log unhandled errors
+app.config['TELEMETRY_TCP_PORT'] = int(os.getenv('TELEMETRY_TCP_PORT', '5001'))  # Framed device telemetry; 0 disables
 
 # Initialize storage for IoT data and alerts
 app.iot_data = {}
 app.device_alerts = {}
 
 # Test data for simulated mouse
-app.iot_data['mouse-001'] = [
+app.iot_data['mouse-001'] = deque([
     {
         'device_id': 'mouse-001',
         'session_id': 'test-session',
-        'timestamp': datetime.now().isoformat(),
+        'ts': time.time_ns(),
         'metrics': {
             'clicks_per_second': 4,
             'movements_count': 120,
@@ -67,12 +101,12 @@ app.iot_data['mouse-001'] = [
             'connection_quality': 95
         }
     }
-]
+], maxlen=routes.security.MAX_RECORDS_PER_DEVICE)
 
 # Add test security alerts
-app.device_alerts['mouse-001'] = [
+app.device_alerts['mouse-001'] = deque([
     {
-        'timestamp': datetime.now().isoformat(),
+        'ts': time.time_ns(),
         'event_type': 'attack_detected',
         'details': {
             'attack_type': 'ping_flood',
@@ -81,7 +115,7 @@ app.device_alerts['mouse-001'] = [
         },
         'severity': 'critical'
     }
-]
+], maxlen=routes.security.MAX_RECORDS_PER_DEVICE)
 # Initialize CORS with more permissive settings for development
 CORS(app, 
     resources={r"/*": {"origins": "*"}}, 
@@ -90,14 +124,26 @@ CORS(app,
     supports_credentials=True
 )
 
+# CORS headers added to all responses, built once
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Client-ID,X-Request-Signature',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
 # Add CORS headers to all responses
 @app.after_request
 def add_cors_headers(response):
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,X-Client-ID,X-Request-Signature'
-    response.headers['Access-Control-Allow-Methods'] = 'GET,POST,PUT,DELETE,OPTIONS'
+    # update() replaces any values Flask-CORS already set rather than duplicating them
+    response.headers.update(CORS_HEADERS)
     return response
 
+# Answer CORS preflights before view dispatch; after_request hooks still add the CORS headers
+@app.before_request
+def handle_preflight():
+    if request.method == 'OPTIONS':
+        return '', 204
+
 # Simple in-memory data storage (replace with database in production)
 users = {
     'admin': {
@@ -138,37 +184,100 @@ devices = {
     }
 }
 
-metrics = {}  # Will store performance metrics
+# Public projection of `devices` (no secrets) served by get_devices, pre-serialized
+# and rebuilt only after the device registry changes
+devices_version = 0
+_public_devices_cache = (-1, 0, None)  # (devices_version, device count, JSON body)
+
+def invalidate_public_devices():
+    """Mark the cached public device list stale after `devices` is modified"""
+    global devices_version
+    devices_version += 1
+
+MAX_METRICS_PER_CLIENT = 10000
+metrics = defaultdict(lambda: deque(maxlen=MAX_METRICS_PER_CLIENT))  # Will store performance metrics, oldest dropped first
 sessions = {}  # Will store session data
 
-# Security audit log
-security_events = []
+# Security audit log, bounded and indexed by severity so filtered reads need no scan.
+# Events are stored as pre-serialized JSON bytes so reads only concatenate them.
+SECURITY_EVENTS_PER_SEVERITY = 10000
+security_events = deque(maxlen=SECURITY_EVENTS_PER_SEVERITY * 3)
+security_events_by_severity = {
+    'info': deque(maxlen=SECURITY_EVENTS_PER_SEVERITY),
+    'warning': deque(maxlen=SECURITY_EVENTS_PER_SEVERITY),
+    'critical': deque(maxlen=SECURITY_EVENTS_PER_SEVERITY)
+}
+
+# Event types logged as warnings when no severity is given; everything else is info
+WARNING_EVENT_TYPES = frozenset({'auth_failure', 'signature_failure'})
+
+# Identical security log lines within this window are written only once
+SECURITY_LOG_DEDUP_WINDOW = 5  # seconds
+SECURITY_LOG_DEDUP_MAX_SIZE = 256
+_recent_security_log_lines = {}
+_security_log_lock = threading.Lock()
+
+# Decoded JWT payloads keyed by raw token string, so repeat bearer tokens
+# (e.g. IoT devices polling every few seconds) skip signature verification
+JWT_CACHE_TTL = 60  # seconds
+JWT_CACHE_MAX_SIZE = 4096
+_jwt_cache = {}
+_jwt_cache_lock = threading.Lock()
+
+def _verify_jwt(token):
+    """Verify a JWT and return its payload, serving recently verified tokens from the cache"""
+    now = time.time()
+    
+    with _jwt_cache_lock:
+        entry = _jwt_cache.get(token)
+        
+    if entry is not None:
+        payload, cached_until = entry
+        if now < cached_until:
+            return payload
+            
+    # Raises on invalid or expired tokens, so those are never cached
+    # Required claims are enforced in the same verified pass
+    payload = jwt.decode(
+        token,
+        app.config['JWT_KEY'],
+        algorithms=['HS256'],
+        options={'require': ['sub', 'exp', 'iat']}
+    )
+    
+    # Never serve a cached payload past the token's own expiry
+    cached_until = min(now + JWT_CACHE_TTL, payload['exp'])
+    
+    with _jwt_cache_lock:
+        if token not in _jwt_cache and len(_jwt_cache) >= JWT_CACHE_MAX_SIZE:
+            # Drop expired entries first, then fall back to the oldest one
+            for cached_token in [t for t, (_, until) in _jwt_cache.items() if until <= now]:
+                del _jwt_cache[cached_token]
+            if len(_jwt_cache) >= JWT_CACHE_MAX_SIZE:
+                del _jwt_cache[next(iter(_jwt_cache))]
+        _jwt_cache[token] = (payload, cached_until)
+        
+    return payload
 
 # Authentication decorator
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        # Handle OPTIONS requests directly for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
-        auth_header = request.headers.get('Authorization')
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
         
-        if not auth_header or not auth_header.startswith('Bearer '):
+        if scheme != 'Bearer' or not token:
             log_security_event('auth_failure', {'reason': 'missing_token', 'ip': request.remote_addr})
             return jsonify({'error': 'Authentication required'}), 401
-            
-        token = auth_header.split(' ')[1]
         
         try:
             # Debug: Log token
-            logger.info(f"Decoding token: {token[:10]}...")
+            logger.debug("Decoding token: %s...", token[:10])
             
-            payload = jwt.decode(token, app.config['JWT_KEY'], algorithms=['HS256'])
+            payload = _verify_jwt(token)
             request.user = payload
             
             # Debug: Log successful auth
-            logger.info(f"Auth successful for user: {payload.get('sub')}")
+            logger.debug("Auth successful for user: %s", payload['sub'])
         except jwt.ExpiredSignatureError:
             log_security_event('auth_failure', {'reason': 'expired_token'})
             return jsonify({'error': 'Token expired'}), 401
@@ -182,20 +291,65 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+# Pre-keyed HMAC-SHA256 objects per client; copying one is cheaper than re-keying
+client_hmac_templates = {}
+
+def _client_signature(client_id, client_secret, data):
+    """Return the hex HMAC-SHA256 of data under a client's secret"""
+    # Copying the pre-keyed template measured faster than the one-shot hmac.digest(),
+    # which has to re-key on every call
+    template = client_hmac_templates.get(client_id)
+    if template is None:
+        template = hmac.new(client_secret.encode(), digestmod=hashlib.sha256)
+        client_hmac_templates[client_id] = template
+    mac = template.copy()
+    mac.update(data)
+    return mac.hexdigest()
+
+# Successful password checks keyed by username, so repeat logins skip PBKDF2
+LOGIN_CACHE_TTL = 300  # seconds
+LOGIN_CACHE_MAX_SIZE = 512
+_login_cache = {}
+_login_cache_lock = threading.Lock()
+
+def _check_password_cached(username, stored_hash, password):
+    """check_password_hash with a short-lived cache of successful verifications"""
+    if not app.config['AUTH_CACHE_ENABLED']:
+        return check_password_hash(stored_hash, password)
+        
+    password_digest = hashlib.sha256(password.encode()).digest()
+    now = time.time()
+    
+    with _login_cache_lock:
+        entry = _login_cache.get(username)
+        
+    if entry is not None:
+        cached_hash, cached_digest, cached_until = entry
+        if (now < cached_until and cached_hash == stored_hash
+                and hmac.compare_digest(cached_digest, password_digest)):
+            return True
+            
+    # Only successful checks are cached
+    if not check_password_hash(stored_hash, password):
+        return False
+        
+    with _login_cache_lock:
+        if username not in _login_cache and len(_login_cache) >= LOGIN_CACHE_MAX_SIZE:
+            del _login_cache[next(iter(_login_cache))]
+        _login_cache[username] = (stored_hash, password_digest, now + LOGIN_CACHE_TTL)
+        
+    return True
+
 # Request signature verification decorator
 def verify_signature(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        # Handle OPTIONS requests directly for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         client_id = request.headers.get('X-Client-ID')
         signature = request.headers.get('X-Request-Signature')
         
         if not client_id or not signature:
             log_security_event('signature_failure', {'reason': 'missing_headers'})
-            return jsonify({'error': 'Missing required headers'}), 400
+            return jsonify({'error': 'Missing required headers'}), 401
             
         # Get client secret
         client_secret = app.config['CLIENT_SECRETS'].get(client_id)
@@ -207,13 +361,8 @@ def verify_signature(f):
                 log_security_event('signature_failure', {'reason': 'unknown_client', 'client_id': client_id})
                 return jsonify({'error': 'Unknown client'}), 401
             
-        # Verify signature
-        request_data = json.dumps(request.json, sort_keys=True)
-        expected_signature = hmac.new(
-            client_secret.encode(),
-            request_data.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        # Verify signature over the raw body bytes exactly as the client signed them
+        expected_signature = _client_signature(client_id, client_secret, request.get_data(cache=True))
         
         if not hmac.compare_digest(signature, expected_signature):
             log_security_event('signature_failure', {'reason': 'invalid_signature', 'client_id': client_id})
@@ -223,19 +372,40 @@ def verify_signature(f):
     return decorated
 
 # Security event logging
-def log_security_event(event_type, details=None):
-    timestamp = datetime.now().isoformat()
+def log_security_event(event_type, details=None, severity=None):
+    # Kept as a datetime; orjson formats it when the event is serialized below
+    timestamp = datetime.now()
+    
+    if severity is None:
+        severity = 'warning' if event_type in WARNING_EVENT_TYPES else 'info'
+    elif severity not in security_events_by_severity:
+        # Only the fixed buckets exist, so a caller can't grow the index with new keys
+        severity = 'info'
     
-    event = {
+    event = orjson.dumps({
         'timestamp': timestamp,
         'event_type': event_type,
         'ip_address': request.remote_addr if request else None,
         'details': details,
-        'severity': 'warning' if event_type.startswith('auth_failure') or event_type.startswith('signature_failure') else 'info'
-    }
+        'severity': severity
+    }, default=str, option=orjson.OPT_NON_STR_KEYS)
     
     security_events.append(event)
-    logger.info(f"SECURITY EVENT: {event_type} - {details}")
+    security_events_by_severity[severity].append(event)
+    
+    # The event is always recorded above; only repeated log lines are suppressed
+    message = f"SECURITY EVENT: {event_type} - {details}"
+    now = time.monotonic()
+    with _security_log_lock:
+        last_logged = _recent_security_log_lines.pop(message, None)
+        if last_logged is not None and now - last_logged < SECURITY_LOG_DEDUP_WINDOW:
+            _recent_security_log_lines[message] = last_logged
+            return
+        _recent_security_log_lines[message] = now
+        if len(_recent_security_log_lines) > SECURITY_LOG_DEDUP_MAX_SIZE:
+            del _recent_security_log_lines[next(iter(_recent_security_log_lines))]
+            
+    logger.info(message)
 
 # Make the function accessible to the app
 app.log_security_event = log_security_event
@@ -251,49 +421,94 @@ app.route_decorator = RouteDecorator()
 # Register security routes
 security_routes = routes.security.register_security_routes(app)
 
+# Devices stream metrics and attack reports over persistent TCP instead of HTTP POSTs.
+# Not started on import; the __main__ block and gunicorn's post_worker_init hook
+# (gunicorn.conf.py) start it in the process that serves requests
+def start_telemetry_listener():
+    """Start the framed device telemetry listener unless TELEMETRY_TCP_PORT is 0"""
+    if app.config['TELEMETRY_TCP_PORT']:
+        return telemetry_tcp.start_telemetry_server(app, port=app.config['TELEMETRY_TCP_PORT'])
+    return None
+
+# --------- Pre-built responses ---------
+
+# Static index page, encoded once at import
+INDEX_HTML = """
+<html>
+    <head>
+        <title>Secure Esports Tracker</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 40px; }
+            h1 { color: #333; }
+        </style>
+    </head>
+    <body>
+        <h1>Secure Esports Equipment Performance Tracker</h1>
+        <p>Server is running. API endpoints available at /api/</p>
+        <h2>Available endpoints:</h2>
+        <ul>
+            <li>/api/auth/login - User login</li>
+            <li>/api/auth/token - Device authentication</li>
+            <li>/api/auth/verify - Verify authentication token</li>
+            <li>/api/metrics/upload - Upload performance metrics</li>
+            <li>/api/metrics/upload_raw - Upload performance metrics as raw binary</li>
+            <li>/api/analytics/performance - Get performance data</li>
+            <li>/api/devices - Manage and view devices</li>
+            <li>/api/sessions/recent - View recent sessions</li>
+            <li>/api/security/logs - View security logs (admin only)</li>
+            <li>/api/security/alert - Receive security alerts from IoT devices</li>
+            <li>/api/security/device_alerts/:device_id - Get security alerts for a device</li>
+            <li>/api/metrics/iot_data - Submit IoT device data</li>
+            <li>/api/metrics/iot_data/:device_id - Get IoT device data</li>
+        </ul>
+    </body>
+</html>
+""".encode('utf-8')
+
+# Sample performance rows: (minutes ago, actions_per_minute, key_press_count, mouse_click_count)
+SAMPLE_PERFORMANCE = (
+    (50, 120, 100, 50),
+    (40, 135, 110, 60),
+    (30, 142, 115, 65),
+    (20, 128, 105, 55),
+    (10, 138, 112, 58)
+)
+
+# Sample sessions: (id, age, duration_minutes, average_apm, device_name)
+SAMPLE_SESSIONS = (
+    ('1', timedelta(days=1), 120, 130, 'Gaming PC'),
+    ('2', timedelta(hours=12), 90, 145, 'Gaming PC'),
+    ('3', timedelta(hours=4), 60, 138, 'Gaming PC')
+)
+
+# Sample device statistics never change, so the response body is serialized once
+SAMPLE_DEVICE_STATS_BODY = orjson.dumps({
+    'devices': [
+        {
+            'device_name': 'Gaming PC',
+            'usage_percentage': 0.75,
+            'average_apm': 135,
+            'total_sessions': 12
+        },
+        {
+            'device_name': 'Laptop',
+            'usage_percentage': 0.25,
+            'average_apm': 110,
+            'total_sessions': 4
+        }
+    ]
+})
+
 # --------- Routes ---------
 
 @app.route('/')
 def index():
     """Simple frontend for demonstration"""
-    return """
-    <html>
-        <head>
-            <title>Secure Esports Tracker</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 40px; }
-                h1 { color: #333; }
-            </style>
-        </head>
-        <body>
-            <h1>Secure Esports Equipment Performance Tracker</h1>
-            <p>Server is running. API endpoints available at /api/</p>
-            <h2>Available endpoints:</h2>
-            <ul>
-                <li>/api/auth/login - User login</li>
-                <li>/api/auth/token - Device authentication</li>
-                <li>/api/auth/verify - Verify authentication token</li>
-                <li>/api/metrics/upload - Upload performance metrics</li>
-                <li>/api/analytics/performance - Get performance data</li>
-                <li>/api/devices - Manage and view devices</li>
-                <li>/api/sessions/recent - View recent sessions</li>
-                <li>/api/security/logs - View security logs (admin only)</li>
-                <li>/api/security/alert - Receive security alerts from IoT devices</li>
-                <li>/api/security/device_alerts/:device_id - Get security alerts for a device</li>
-                <li>/api/metrics/iot_data - Submit IoT device data</li>
-                <li>/api/metrics/iot_data/:device_id - Get IoT device data</li>
-            </ul>
-        </body>
-    </html>
-    """
+    return Response(INDEX_HTML, mimetype='text/html')
 
 @app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
 def login():
     """User login endpoint"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     data = request.json
     username = data.get('username')
     password = data.get('password')
@@ -303,7 +518,7 @@ def login():
         
     user = users.get(username)
     
-    if not user or not check_password_hash(user['password'], password):
+    if not user or not _check_password_cached(username, user['password'], password):
         log_security_event('login_failure', {'username': username})
         return jsonify({'error': 'Invalid credentials'}), 401
         
@@ -317,12 +532,12 @@ def login():
     }
     
     # Debug: Print the key used for JWT encoding
-    logger.info(f"JWT Key type: {type(app.config['JWT_KEY'])}")
+    logger.debug("JWT Key type: %s", type(app.config['JWT_KEY']))
     
     token = jwt.encode(token_data, app.config['JWT_KEY'], algorithm='HS256')
     
     # Debug: Log the token
-    logger.info(f"Generated token: {token[:10]}...")
+    logger.debug("Generated token: %s...", token[:10])
     
     log_security_event('login_success', {'username': username})
     
@@ -337,29 +552,23 @@ def login():
 @app.route('/api/auth/verify', methods=['GET', 'OPTIONS'])
 def verify_token():
     """Verify authentication token and return user data"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
-    auth_header = request.headers.get('Authorization')
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
     
-    if not auth_header or not auth_header.startswith('Bearer '):
+    if scheme != 'Bearer' or not token:
         return jsonify({'error': 'Authentication required'}), 401
-        
-    token = auth_header.split(' ')[1]
     
     try:
         # Debug: Log token being verified
-        logger.info(f"Verifying token: {token[:10]}...")
+        logger.debug("Verifying token: %s...", token[:10])
         
-        payload = jwt.decode(token, app.config['JWT_KEY'], algorithms=['HS256'])
+        payload = _verify_jwt(token)
         
         # Return user data
-        username = payload.get('sub')
+        username = payload['sub']
         role = payload.get('role', 'user')
         
         # Debug: Log successful verification
-        logger.info(f"Token verification successful for user: {username}")
+        logger.debug("Token verification successful for user: %s", username)
         
         return jsonify({
             'username': username,
@@ -379,10 +588,6 @@ def verify_token():
 @app.route('/api/auth/token', methods=['POST', 'OPTIONS'])
 def get_token():
     """Generate authentication token for client"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         data = request.json
         client_id = data.get('client_id')
@@ -416,6 +621,7 @@ def get_token():
                 'device_type': data.get('device_type', 'unknown')
             }
             devices[client_id] = device
+            invalidate_public_devices()
             app.config['CLIENT_SECRETS'][client_id] = client_secret
             log_security_event('device_registered', {'client_id': client_id})
         else:
@@ -423,11 +629,7 @@ def get_token():
             if signature:
                 # Verify signature
                 signature_data = f"{client_id}:{timestamp}"
-                expected_signature = hmac.new(
-                    device['client_secret'].encode(),
-                    signature_data.encode(),
-                    hashlib.sha256
-                ).hexdigest()
+                expected_signature = _client_signature(client_id, device['client_secret'], signature_data.encode())
                 
                 if not hmac.compare_digest(signature, expected_signature):
                     log_security_event('auth_failure', {'reason': 'signature_invalid', 'client_id': client_id})
@@ -459,10 +661,6 @@ def get_token():
 @verify_signature
 def upload_metrics():
     """Receive encrypted metrics data from clients"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         data = request.json
         client_id = data.get('client_id')
@@ -472,6 +670,7 @@ def upload_metrics():
             return jsonify({'error': 'Missing required parameters'}), 400
             
         # Decode base64 data
+        import base64
         encrypted_data = base64.b64decode(encoded_data)
         
         # Find device
@@ -480,10 +679,7 @@ def upload_metrics():
             return jsonify({'error': 'Unknown device'}), 401
             
         # Store encrypted data (in production, would decrypt and store in database)
-        timestamp = datetime.utcnow().isoformat()
-        if client_id not in metrics:
-            metrics[client_id] = []
-            
+        timestamp = datetime.utcnow()
         metrics[client_id].append({
             'timestamp': timestamp,
             'encrypted_data': encrypted_data
@@ -502,50 +698,61 @@ def upload_metrics():
         logger.error(f"Error processing metrics: {e}")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+@app.route('/api/metrics/upload_raw', methods=['POST', 'OPTIONS'])
+@require_auth
+@verify_signature
+def upload_metrics_raw():
+    """Receive encrypted metrics data sent as a raw binary body (application/octet-stream)"""
+    try:
+        # Client is identified by the header already checked in verify_signature
+        client_id = request.headers.get('X-Client-ID')
+        
+        # Body was read and cached while verifying the signature, no base64 to undo
+        encrypted_data = request.get_data(cache=True)
+        
+        if not encrypted_data:
+            return jsonify({'error': 'Missing required parameters'}), 400
+            
+        # Find device
+        device = devices.get(client_id)
+        if not device:
+            return jsonify({'error': 'Unknown device'}), 401
+            
+        # Store encrypted bytes as received (in production, would decrypt and store in database)
+        metrics[client_id].append({
+            'timestamp': datetime.utcnow(),
+            'encrypted_data': encrypted_data
+        })
+        
+        log_security_event('data_received', {
+            'client_id': client_id,
+            'data_size': len(encrypted_data)
+        })
+        
+        return jsonify({'status': 'success'})
+        
+    except Exception as e:
+        logger.error(f"Error processing raw metrics: {e}")
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+
 @app.route('/api/analytics/performance', methods=['GET', 'OPTIONS'])
 @require_auth
 def get_performance():
     """Get performance analytics (simplified demo version)"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         time_range = request.args.get('timeRange', 'day')
         
         # In a real implementation, would fetch and decrypt data from database
         # For demonstration, return sample data
+        now = datetime.utcnow()
         sample_data = [
             {
-                'timestamp': (datetime.utcnow() - timedelta(minutes=50)).isoformat(),
-                'actions_per_minute': 120,
-                'key_press_count': 100,
-                'mouse_click_count': 50
-            },
-            {
-                'timestamp': (datetime.utcnow() - timedelta(minutes=40)).isoformat(),
-                'actions_per_minute': 135,
-                'key_press_count': 110,
-                'mouse_click_count': 60
-            },
-            {
-                'timestamp': (datetime.utcnow() - timedelta(minutes=30)).isoformat(),
-                'actions_per_minute': 142,
-                'key_press_count': 115,
-                'mouse_click_count': 65
-            },
-            {
-                'timestamp': (datetime.utcnow() - timedelta(minutes=20)).isoformat(),
-                'actions_per_minute': 128,
-                'key_press_count': 105,
-                'mouse_click_count': 55
-            },
-            {
-                'timestamp': (datetime.utcnow() - timedelta(minutes=10)).isoformat(),
-                'actions_per_minute': 138,
-                'key_press_count': 112,
-                'mouse_click_count': 58
+                'timestamp': now - timedelta(minutes=minutes_ago),
+                'actions_per_minute': actions_per_minute,
+                'key_press_count': key_press_count,
+                'mouse_click_count': mouse_click_count
             }
+            for minutes_ago, actions_per_minute, key_press_count, mouse_click_count in SAMPLE_PERFORMANCE
         ]
         
         return jsonify({'data': sample_data})
@@ -558,10 +765,6 @@ def get_performance():
 @require_auth
 def get_security_logs():
     """Get security logs (admin only)"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         # Check if user is admin
         if request.user.get('role') != 'admin':
@@ -574,9 +777,11 @@ def get_security_logs():
         if severity == 'all':
             filtered_logs = security_events
         else:
-            filtered_logs = [log for log in security_events if log.get('severity') == severity]
+            filtered_logs = security_events_by_severity.get(severity, ())
             
-        return jsonify({'logs': filtered_logs})
+        # Events are already JSON, so the response is assembled by concatenation
+        body = b'{"logs":[' + b','.join(filtered_logs) + b']}'
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error retrieving security logs: {e}")
@@ -586,30 +791,35 @@ def get_security_logs():
 @require_auth
 def get_devices():
     """Get registered devices"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     # Debug: Log request details
-    logger.info(f"Devices request received from IP: {request.remote_addr}")
-    logger.info(f"Headers: {dict(request.headers)}")
+    logger.debug("Devices request received from IP: %s", request.remote_addr)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Headers: %s", dict(request.headers))
     
     try:
-        # Always show sample devices
-        user_devices = []
-        for device_id, device in devices.items():
-            # Remove sensitive information
-            device_info = {
-                'client_id': device_id,
-                'name': device.get('name', f"Device {device_id[:8]}"),
-                'device_type': device.get('device_type', 'unknown'),
-                'status': device.get('status', 'active'),
-                'registered_at': device.get('registered_at', datetime.utcnow().isoformat())
-            }
-            user_devices.append(device_info)
+        global _public_devices_cache
         
-        logger.info(f"Returning {len(user_devices)} devices")
-        return jsonify({'devices': user_devices})
+        cached_version, device_count, body = _public_devices_cache
+        if cached_version != devices_version:
+            version = devices_version
+            
+            # Always show sample devices, with sensitive information removed
+            user_devices = [
+                {
+                    'client_id': device_id,
+                    'name': device.get('name', f"Device {device_id[:8]}"),
+                    'device_type': device.get('device_type', 'unknown'),
+                    'status': device.get('status', 'active'),
+                    'registered_at': device.get('registered_at', datetime.utcnow().isoformat())
+                }
+                for device_id, device in list(devices.items())
+            ]
+            device_count = len(user_devices)
+            body = orjson.dumps({'devices': user_devices})
+            _public_devices_cache = (version, device_count, body)
+        
+        logger.debug("Returning %d devices", device_count)
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error retrieving devices: {e}", exc_info=True)
@@ -619,10 +829,6 @@ def get_devices():
 @require_auth
 def register_device():
     """Register a new device"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         data = request.json
         device_name = data.get('name')
@@ -632,8 +838,9 @@ def register_device():
             return jsonify({'error': 'Device name is required'}), 400
             
         # Generate device credentials
+        import uuid
         client_id = str(uuid.uuid4())
-        client_secret = base64.b64encode(os.urandom(32)).decode('utf-8')
+        client_secret = secrets.token_urlsafe(32)
         
         # Store device
         devices[client_id] = {
@@ -644,6 +851,7 @@ def register_device():
             'status': 'active',
             'registered_at': datetime.utcnow().isoformat()
         }
+        invalidate_public_devices()
         
         log_security_event('device_registered', {
             'client_id': client_id,
@@ -668,46 +876,33 @@ def register_device():
 @require_auth
 def get_recent_sessions():
     """Get recent sessions with performance data"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         filter_type = request.args.get('filter', 'all')
         
         # In a real implementation, would fetch from database
         # For demonstration, return sample data
-        recent_sessions = [
-            {
-                'id': '1',
-                'start_time': (datetime.utcnow() - timedelta(days=1)).isoformat(),
-                'duration_minutes': 120,
-                'average_apm': 130,
-                'device_name': 'Gaming PC'
-            },
-            {
-                'id': '2',
-                'start_time': (datetime.utcnow() - timedelta(hours=12)).isoformat(),
-                'duration_minutes': 90,
-                'average_apm': 145,
-                'device_name': 'Gaming PC'
-            },
-            {
-                'id': '3',
-                'start_time': (datetime.utcnow() - timedelta(hours=4)).isoformat(),
-                'duration_minutes': 60,
-                'average_apm': 138,
-                'device_name': 'Gaming PC'
-            }
-        ]
+        # Sessions carry an epoch 'start_ts' next to the ISO string so filters compare ints;
+        # an aware UTC 'now' keeps .timestamp() independent of the host's timezone
+        now = datetime.now(timezone.utc)
+        recent_sessions = []
+        for session_id, age, duration_minutes, average_apm, device_name in SAMPLE_SESSIONS:
+            start_time = now - age
+            recent_sessions.append({
+                'id': session_id,
+                'start_time': start_time.replace(tzinfo=None).isoformat(),
+                'start_ts': int(start_time.timestamp()),
+                'duration_minutes': duration_minutes,
+                'average_apm': average_apm,
+                'device_name': device_name
+            })
         
         # Filter sessions based on time if needed
         if filter_type == 'week':
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            recent_sessions = [s for s in recent_sessions if datetime.fromisoformat(s['start_time']) > week_ago]
+            week_ago_ts = int((now - timedelta(days=7)).timestamp())
+            recent_sessions = [s for s in recent_sessions if s['start_ts'] > week_ago_ts]
         elif filter_type == 'month':
-            month_ago = datetime.utcnow() - timedelta(days=30)
-            recent_sessions = [s for s in recent_sessions if datetime.fromisoformat(s['start_time']) > month_ago]
+            month_ago_ts = int((now - timedelta(days=30)).timestamp())
+            recent_sessions = [s for s in recent_sessions if s['start_ts'] > month_ago_ts]
         
         return jsonify({'sessions': recent_sessions})
         
@@ -719,29 +914,10 @@ def get_recent_sessions():
 @require_auth
 def get_device_stats():
     """Get device usage statistics"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         # In a real implementation, would calculate from database
         # For demonstration, return sample data
-        device_stats = [
-            {
-                'device_name': 'Gaming PC',
-                'usage_percentage': 0.75,
-                'average_apm': 135,
-                'total_sessions': 12
-            },
-            {
-                'device_name': 'Laptop',
-                'usage_percentage': 0.25,
-                'average_apm': 110,
-                'total_sessions': 4
-            }
-        ]
-        
-        return jsonify({'devices': device_stats})
+        return Response(SAMPLE_DEVICE_STATS_BODY, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error retrieving device statistics: {e}")
@@ -751,13 +927,9 @@ def get_device_stats():
 @require_auth
 def update_user_settings():
     """Update user settings"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         data = request.json
-        username = request.user.get('sub')
+        username = request.user['sub']
         
         # In a real implementation, would update in database
         # For demonstration, just return success
@@ -775,10 +947,6 @@ def update_user_settings():
 @require_auth
 def send_device_command(device_id):
     """Send a command to an IoT device"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        return '', 204
-        
     try:
         data = request.json
         command = data.get('command')
@@ -810,28 +978,26 @@ def send_device_command(device_id):
 @app.route('/api/debug/iot_data/<device_id>', methods=['GET'])
 def debug_iot_data(device_id):
     """Debug endpoint to view IoT data without authentication"""
-    if not hasattr(app, 'iot_data'):
-        return jsonify({'error': 'No IoT data storage initialized'}), 404
-    
-    if device_id not in app.iot_data:
+    records = app.iot_data.get(device_id)
+    if records is None:
         return jsonify({'error': f'No data for device {device_id}'}), 404
     
-    return jsonify({'data': app.iot_data[device_id]})
+    return jsonify({'data': list(records)})
 
 @app.route('/api/debug/device_alerts/<device_id>', methods=['GET'])
 def debug_device_alerts(device_id):
     """Debug endpoint to view device alerts without authentication"""
-    if not hasattr(app, 'device_alerts'):
-        return jsonify({'error': 'No device alerts storage initialized'}), 404
-    
-    if device_id not in app.device_alerts:
+    alerts = app.device_alerts.get(device_id)
+    if alerts is None:
         return jsonify({'error': f'No alerts for device {device_id}'}), 404
     
-    return jsonify({'alerts': app.device_alerts[device_id]})
+    return jsonify({'alerts': list(alerts)})
 
 # ------- Main application entry point -------
 
 if __name__ == '__main__':
     print("Starting Secure Esports Equipment Performance Tracker Server...")
     print("Server available at http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    start_telemetry_listener()
+    # Development fallback only; production runs under gunicorn (see Procfile)
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
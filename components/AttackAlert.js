@@ -1,7 +1,9 @@
 import React from 'react';
 
 const AttackAlert = ({ attack }) => {
-  const severity = attack.packet_count > 1000 ? 'CRITICAL' : 'WARNING';
+  // Devices report how many packets arrived within window_s seconds
+  const rate = attack.window_s > 0 ? attack.packets / attack.window_s : Infinity;
+  const severity = rate > 1000 ? 'CRITICAL' : 'WARNING';
 
   return (
     <div className="attack-alert">
@@ -16,7 +18,7 @@ const AttackAlert = ({ attack }) => {
       <div className="attack-details">
         <p>Attack detected on {attack.device_type}</p>
         <p>Source: {attack.attack_source}</p>
-        <p>Packets: {attack.packet_count}</p>
+        <p>Packets: {attack.packets} in {attack.window_s.toFixed(3)}s</p>
       </div>
     </div>
   );
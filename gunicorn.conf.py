@@ -0,0 +1,7 @@
+# Loaded by gunicorn from the working directory (see Procfile)
+
+def post_worker_init(worker):
+    """Start the device telemetry listener in the worker, next to the stores it writes to"""
+    # With more than one worker only the first binds the port; the others log the failure
+    from app import start_telemetry_listener
+    start_telemetry_listener()
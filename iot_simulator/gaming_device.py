@@ -1,9 +1,157 @@
+import heapq
 import socket
+import selectors
+import struct
 import time
-import json
-import random
 import threading
-from datetime import datetime
+from collections import deque
+
+import msgpack
+import numpy as np
+
+# Monitoring server's framed telemetry listener for metrics and attack reports
+SERVER_HOST = 'localhost'
+SERVER_PORT = 5001
+
+# Metrics are sent as deltas; a full snapshot goes out every this many ticks
+# so the server can resynchronise after a dropped message
+FULL_SNAPSHOT_INTERVAL = 60
+
+# More than this many packets within one second counts as an attack
+ATTACK_PPS_THRESHOLD = 100
+# Recent packet arrival times kept for the sliding-window rate check
+PACKET_RING_SIZE = 128
+
+# Seconds between metric reports from each device
+METRICS_INTERVAL = 1
+
+# Most packets read from one socket per wakeup, so one flooded device can't starve the rest
+MAX_PACKETS_PER_WAKEUP = 64
+
+# Random metric inputs are drawn in bulk, this many ticks (one hour) at a time
+METRIC_DRAW_TICKS = 3600
+
+class ConnectionPool:
+    """Bounded pool of persistent TCP connections, keyed by (host, port)"""
+    
+    def __init__(self, max_active=8, max_idle=4, idle_timeout=300):
+        self.max_active = max_active
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = {}  # (host, port) -> deque of (socket, released_at)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_active)
+        
+        # Close connections that have sat idle for too long
+        self._reaper_thread = threading.Thread(target=self._reap_idle)
+        self._reaper_thread.daemon = True
+        self._reaper_thread.start()
+        
+    def acquire(self, host, port, fresh=False):
+        """Get a connected socket, reusing an idle one unless fresh is requested"""
+        self._slots.acquire()
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get((host, port))
+                if idle:
+                    return idle.pop()[0]
+        try:
+            return socket.create_connection((host, port), timeout=5)
+        except Exception:
+            self._slots.release()
+            raise
+            
+    def release(self, sock, host, port):
+        """Return a healthy socket to the pool, closing it if the idle set is full"""
+        with self._lock:
+            idle = self._idle.setdefault((host, port), deque())
+            if len(idle) < self.max_idle:
+                idle.append((sock, time.time()))
+                sock = None
+        if sock is not None:
+            sock.close()
+        self._slots.release()
+        
+    def discard(self, sock):
+        """Close a broken socket instead of returning it to the pool"""
+        try:
+            sock.close()
+        finally:
+            self._slots.release()
+            
+    def _reap_idle(self):
+        """Background loop closing idle connections past idle_timeout"""
+        while True:
+            time.sleep(min(60, self.idle_timeout))
+            cutoff = time.time() - self.idle_timeout
+            expired = []
+            with self._lock:
+                for idle in self._idle.values():
+                    # Oldest connections sit at the left of each deque
+                    while idle and idle[0][1] < cutoff:
+                        expired.append(idle.popleft()[0])
+            for sock in expired:
+                sock.close()
+
+# Shared by every simulated device in this process
+connection_pool = ConnectionPool()
+
+class TelemetrySender:
+    """Coalesces queued frames from all devices into one sendall per batch"""
+    
+    def __init__(self, host, port, linger=0.05, max_pending=10000):
+        self.host = host
+        self.port = port
+        self.linger = linger  # seconds to wait for more frames before flushing
+        self._pending = deque(maxlen=max_pending)
+        self._wakeup = threading.Event()
+        
+        self._sender_thread = threading.Thread(target=self._run)
+        self._sender_thread.daemon = True
+        self._sender_thread.start()
+        
+    def submit(self, frame):
+        """Queue a length-prefixed frame without blocking the caller"""
+        self._pending.append(frame)
+        self._wakeup.set()
+        
+    def _run(self):
+        """Background loop draining the queue in batches"""
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.linger)
+            self._wakeup.clear()
+            
+            frames = []
+            while self._pending:
+                frames.append(self._pending.popleft())
+            if not frames:
+                continue
+            try:
+                self._flush(b''.join(frames))
+            except Exception as e:
+                print(f"Error sending telemetry batch ({len(frames)} messages): {e}")
+                
+    def _flush(self, batch):
+        """Write a batch over a pooled connection"""
+        sock = connection_pool.acquire(self.host, self.port)
+        try:
+            sock.sendall(batch)
+        except (BrokenPipeError, ConnectionResetError):
+            # Idle connection was closed by the server, retry once on a new one
+            connection_pool.discard(sock)
+            sock = connection_pool.acquire(self.host, self.port, fresh=True)
+            try:
+                sock.sendall(batch)
+            except Exception:
+                connection_pool.discard(sock)
+                raise
+        except Exception:
+            connection_pool.discard(sock)
+            raise
+        connection_pool.release(sock, self.host, self.port)
+
+telemetry_sender = TelemetrySender(SERVER_HOST, SERVER_PORT)
 
 class GamingPeripheral:
     def __init__(self, device_type="keyboard", port=5555):
@@ -17,93 +165,172 @@ class GamingPeripheral:
             'battery_level': 100,
             'connection_quality': 100
         }
+        self.device_id = f"{device_type}-{port}"
+        self._last_metrics = {}
+        self._ticks_since_snapshot = 0
+        
+        # Packet rate tracking
+        self._recv_buf = bytearray(2048)
+        self._packet_times = [0.0] * PACKET_RING_SIZE
+        self._packet_index = 0
+        self._last_check_time = time.monotonic()
+        
+        self._rng = np.random.default_rng()
+        self._refill_metric_draws()
         
     def start(self):
         """Start the IoT device simulation"""
-        # Start UDP server to receive commands
+        run_devices([self])
+        
+    def open_sockets(self):
+        """Bind the non-blocking UDP socket that receives commands"""
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.bind(('0.0.0.0', self.port))
+        self.sock.setblocking(False)
         print(f"IoT {self.device_type} simulator running on port {self.port}")
+        return [self.sock]
         
-        # Start metrics generation thread
-        self.metrics_thread = threading.Thread(target=self._generate_metrics)
-        self.metrics_thread.daemon = True
-        self.metrics_thread.start()
-        
-        # Listen for incoming packets
-        while self.running:
+    def on_readable(self, sock):
+        """Drain pending packets from a socket the selector reported as readable"""
+        # Packets are read into a reused buffer; only the sender address matters
+        for _ in range(MAX_PACKETS_PER_WAKEUP):
             try:
-                data, addr = self.sock.recvfrom(1024)
-                if data:
-                    # Check if under attack based on packet frequency
-                    self._check_attack(addr[0])
+                nbytes, addr = sock.recvfrom_into(self._recv_buf)
+            except BlockingIOError:
+                return
             except Exception as e:
                 print(f"Error receiving data: {e}")
+                return
+            if nbytes:
+                # Check if under attack based on packet frequency
+                self._check_attack(addr[0])
                 
-    def _generate_metrics(self):
-        """Generate simulated device metrics"""
-        while self.running:
-            # Simulate normal device operation
-            self.metrics['input_rate'] = random.randint(60, 200)
-            self.metrics['response_time'] = random.uniform(1, 5)
-            self.metrics['error_rate'] = random.uniform(0, 0.5)
-            self.metrics['battery_level'] = max(0, self.metrics['battery_level'] - random.uniform(0, 0.1))
-            self.metrics['connection_quality'] = max(0, min(100, self.metrics['connection_quality'] + random.uniform(-1, 1)))
+    def tick(self):
+        """Generate and send one round of simulated device metrics"""
+        # Simulate normal device operation
+        input_rate, response_time, error_rate, battery_drain, quality_step = self._metric_draws[self._draw_index]
+        self._draw_index += 1
+        if self._draw_index == METRIC_DRAW_TICKS:
+            self._refill_metric_draws()
             
-            # Send metrics to monitoring server
-            self._send_metrics()
-            time.sleep(1)
+        self.metrics['input_rate'] = input_rate
+        self.metrics['response_time'] = response_time
+        self.metrics['error_rate'] = error_rate
+        self.metrics['battery_level'] = max(0, self.metrics['battery_level'] - battery_drain)
+        self.metrics['connection_quality'] = max(0, min(100, self.metrics['connection_quality'] + quality_step))
+        
+        # Send metrics to monitoring server
+        self._send_metrics()
             
+    def _refill_metric_draws(self):
+        """Draw the next METRIC_DRAW_TICKS ticks of random metric inputs in one go"""
+        n = METRIC_DRAW_TICKS
+        rng = self._rng
+        # tolist() so each tick reads plain Python numbers, which msgpack can pack
+        self._metric_draws = list(zip(
+            rng.integers(60, 201, n).tolist(),
+            rng.uniform(1, 5, n).tolist(),
+            rng.uniform(0, 0.5, n).tolist(),
+            rng.uniform(0, 0.1, n).tolist(),
+            rng.uniform(-1, 1, n).tolist()
+        ))
+        self._draw_index = 0
+        
     def _check_attack(self, source_ip):
         """Check if device is under attack based on packet frequency"""
-        # Track packet frequency
-        current_time = time.time()
-        if not hasattr(self, '_last_check_time'):
-            self._last_check_time = current_time
-            self._packet_count = 0
-        
-        self._packet_count += 1
-        
-        # Check rate every second
-        if current_time - self._last_check_time >= 1:
-            if self._packet_count > 100:  # Threshold for attack detection
-                self._report_attack(source_ip, self._packet_count)
-            self._packet_count = 0
-            self._last_check_time = current_time
+        current_time = time.monotonic()
+        index = self._packet_index
+        self._packet_times[index % PACKET_RING_SIZE] = current_time
+        self._packet_index = index + 1
+        
+        # Over the threshold if the packet ATTACK_PPS_THRESHOLD arrivals ago is under a second old
+        if index < ATTACK_PPS_THRESHOLD:
+            return
+        window_start = self._packet_times[(index - ATTACK_PPS_THRESHOLD) % PACKET_RING_SIZE]
+        if current_time - window_start >= 1:
+            return
+        
+        # Report at most once per second
+        if current_time - self._last_check_time < 1:
+            return
+        # Report the window that tripped the check: this packet and the ATTACK_PPS_THRESHOLD before it
+        self._report_attack(source_ip, ATTACK_PPS_THRESHOLD + 1, current_time - window_start)
+        self._last_check_time = current_time
             
-    def _report_attack(self, source_ip, packet_count):
+    def _report_attack(self, source_ip, packets, window_s):
         """Report attack to monitoring server"""
         try:
             attack_data = {
-                'device_type': self.device_type,
-                'port': self.port,
-                'attack_source': source_ip,
-                'packet_count': packet_count,
-                'timestamp': datetime.now().isoformat()
+                'device_id': self.device_id,
+                'event_type': 'attack_detected',
+                'details': {
+                    'device_type': self.device_type,
+                    'port': self.port,
+                    'attack_source': source_ip,
+                    'packets': packets,
+                    'window_s': window_s,  # seconds between the first and last packet
+                    'ts': time.time_ns()  # epoch nanoseconds
+                }
             }
             # Send attack data to monitoring server
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect(('localhost', 5000))
-            sock.send(json.dumps(attack_data).encode())
-            sock.close()
+            self._send(msgpack.packb(attack_data, use_bin_type=True))
         except Exception as e:
             print(f"Error reporting attack: {e}")
             
     def _send_metrics(self):
         """Send device metrics to monitoring server"""
         try:
+            # Only send the metrics that changed since the previous tick
+            if self._ticks_since_snapshot >= FULL_SNAPSHOT_INTERVAL:
+                self._last_metrics = {}
+                self._ticks_since_snapshot = 0
+            delta = {k: v for k, v in self.metrics.items() if v != self._last_metrics.get(k)}
+            self._last_metrics = dict(self.metrics)
+            self._ticks_since_snapshot += 1
+            
             metrics_data = {
+                'device_id': self.device_id,
                 'device_type': self.device_type,
-                'metrics': self.metrics,
-                'timestamp': datetime.now().isoformat()
+                'ts': time.time_ns(),  # epoch nanoseconds
+                'delta': delta
             }
             # Send metrics to monitoring server
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect(('localhost', 5000))
-            sock.send(json.dumps(metrics_data).encode())
-            sock.close()
+            self._send(msgpack.packb(metrics_data, use_bin_type=True))
         except Exception as e:
             print(f"Error sending metrics: {e}")
+            
+    def _send(self, payload):
+        """Queue one message for the batched sender"""
+        # 4-byte big-endian length prefix so several messages can share a connection
+        telemetry_sender.submit(struct.pack('>I', len(payload)) + payload)
+
+def run_devices(devices):
+    """Drive every device from one thread: a selector for UDP packets and a heap of metric ticks"""
+    selector = selectors.DefaultSelector()
+    schedule = []  # (due, index, device); index breaks ties between devices
+    now = time.monotonic()
+    for index, device in enumerate(devices):
+        for sock in device.open_sockets():
+            selector.register(sock, selectors.EVENT_READ, device)
+        heapq.heappush(schedule, (now, index, device))
+        
+    try:
+        while schedule:
+            # Sleep in select until a packet arrives or the next tick is due
+            timeout = max(0, schedule[0][0] - time.monotonic())
+            for key, _ in selector.select(timeout):
+                key.data.on_readable(key.fileobj)
+                
+            now = time.monotonic()
+            while schedule and schedule[0][0] <= now:
+                due, index, device = heapq.heappop(schedule)
+                if device.running:
+                    device.tick()
+                    heapq.heappush(schedule, (due + METRICS_INTERVAL, index, device))
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
 
 def main():
     # Create simulated devices
@@ -113,18 +340,9 @@ def main():
         GamingPeripheral("headset", 5557)
     ]
     
-    # Start device threads
-    threads = []
-    for device in devices:
-        thread = threading.Thread(target=device.start)
-        thread.daemon = True
-        thread.start()
-        threads.append(thread)
-        
-    # Wait for threads
+    # One thread serves every device's sockets and metric ticks
     try:
-        while True:
-            time.sleep(1)
+        run_devices(devices)
     except KeyboardInterrupt:
         print("Shutting down simulators...")
         for device in devices:
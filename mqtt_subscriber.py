@@ -139,7 +139,9 @@ class MQTTSubscriber:
                 
                 # Process message based on type
                 if message_type == 'data':
-                    self._process_data_message(device_id, payload)
+                    # Devices may batch several samples into one message
+                    for record in payload.get('batch', (payload,)):
+                        self._process_data_message(device_id, record)
                 elif message_type == 'status':
                     self._process_status_message(device_id, payload)
                 elif message_type == 'security':
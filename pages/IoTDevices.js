@@ -251,7 +251,7 @@ const IoTDevices = ({ user }) => {
               {securityAlerts.slice().reverse().map((alert, index) => (
                 <tr key={index}>
                   <td style={{ padding: '12px 8px', borderBottom: '1px solid var(--border-color)' }}>
-                    {formatDate(alert.timestamp)}
+                    {formatDate(alert.ts / 1e6)}
                   </td>
                   <td style={{ padding: '12px 8px', borderBottom: '1px solid var(--border-color)' }}>
                     {alert.event_type.replace(/_/g, ' ')}
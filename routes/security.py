@@ -1,21 +1,183 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, Response
+from collections import defaultdict, deque
 from datetime import datetime
 import json
+import time
 import logging
+import threading
+import zlib
+from functools import lru_cache
+
+import msgpack
+import numpy as np
 
 # Get logger
 logger = logging.getLogger('server')
 
+# Only the latest alerts and data points are kept per device
+MAX_RECORDS_PER_DEVICE = 100
+
+def _scatter_hotspot(rng, position_heatmap, click_heatmap, count, x_dist, y_dist,
+                     position_weight, click_probability, click_weight):
+    """Add `count` normally distributed samples to the heatmaps in one vectorized pass
+    
+    x_dist / y_dist are (mean, std, low, high); weights are (scale, offset) applied to
+    uniform [0, 1) draws. Samples are binned with np.bincount on flat cell indices,
+    which accumulates repeated cells in a single C loop.
+    """
+    x_mean, x_std, x_low, x_high = x_dist
+    y_mean, y_std, y_low, y_high = y_dist
+    xs = np.clip(rng.normal(x_mean, x_std, count), x_low, x_high).astype(np.intp)
+    ys = np.clip(rng.normal(y_mean, y_std, count), y_low, y_high).astype(np.intp)
+    cells = ys * position_heatmap.shape[1] + xs
+    size = position_heatmap.size
+    
+    position_weights = rng.random(count) * position_weight[0] + position_weight[1]
+    position_heatmap += np.bincount(cells, position_weights, size).reshape(position_heatmap.shape)
+    
+    # Only some movements have a click
+    clicked = rng.random(count) < click_probability
+    click_count = int(clicked.sum())
+    click_weights = rng.random(click_count) * click_weight[0] + click_weight[1]
+    click_heatmap += np.bincount(cells[clicked], click_weights, size).reshape(click_heatmap.shape)
+
+# Heatmap grid dimensions (scaled down screen resolution)
+HEATMAP_WIDTH = 192  # 1920 / 10
+HEATMAP_HEIGHT = 108  # 1080 / 10
+
+@lru_cache(maxsize=256)
+def _base_heatmaps(device_id):
+    """Seeded hotspot layers for a device, computed once and shared read-only
+    
+    The result depends only on device_id, so it never goes stale; requests copy
+    it and add their own time-varying noise.
+    """
+    width = HEATMAP_WIDTH
+    height = HEATMAP_HEIGHT
+    
+    # Seed with device_id to get consistent results
+    seed = zlib.crc32(device_id.encode()) % 10000
+    rng = np.random.default_rng(seed)
+    
+    # float32 is plenty for accumulation; the output is quantized to uint8 anyway
+    position_heatmap = np.zeros((height, width), dtype=np.float32)
+    click_heatmap = np.zeros((height, width), dtype=np.float32)
+    
+    # Generate hotspots based on typical gaming patterns
+    # Center area (where most movement happens)
+    center_x = width // 2
+    center_y = height // 2
+    
+    # Add Gaussian distribution around center
+    _scatter_hotspot(rng, position_heatmap, click_heatmap, 5000,
+                     (center_x, width/6, 0, width-1), (center_y, height/6, 0, height-1),
+                     (2, 1), 0.3, (5, 1))
+    
+    # Add hotspot in top-left (menu area)
+    _scatter_hotspot(rng, position_heatmap, click_heatmap, 1000,
+                     (width/10, width/20, 0, width/5), (height/10, height/20, 0, height/5),
+                     (3, 1), 0.4, (8, 2))
+            
+    # Add hotspot in bottom center (action bar area)
+    _scatter_hotspot(rng, position_heatmap, click_heatmap, 1000,
+                     (center_x, width/6, center_x-width/5, center_x+width/5), (height*0.9, height/20, height*0.8, height-1),
+                     (2, 1), 0.5, (6, 3))
+    
+    position_heatmap.setflags(write=False)
+    click_heatmap.setflags(write=False)
+    return position_heatmap, click_heatmap
+
+# Pre-drawn noise layers; requests pick one by the current second
+NOISE_POOL_SIZE = 16
+
+@lru_cache(maxsize=1)
+def _noise_pool():
+    """(NOISE_POOL_SIZE, 2, height, width) position/click noise, drawn on first use"""
+    rng = np.random.default_rng()
+    pool = rng.random((NOISE_POOL_SIZE, 2, HEATMAP_HEIGHT, HEATMAP_WIDTH), dtype=np.float32)
+    pool[:, 0] *= 5
+    pool[:, 1] *= 2
+    pool.setflags(write=False)
+    return pool
+
+def _normalized_u8(base, noise):
+    """base + noise scaled to a 0-100 range as uint8
+    
+    np.add allocates the accumulator, so the cached base layer needs no separate copy.
+    """
+    heatmap = np.add(base, noise)
+    peak = heatmap.max()
+    if peak > 0:
+        # Nudge the scale up so float rounding can't truncate the peak cell to 99
+        heatmap *= 100 * (1 + 1e-6) / peak
+    return heatmap.astype(np.uint8)
+
 def register_security_routes(app):
     """Register security-related routes with the Flask app"""
     
+    # Per-device stores, created once here; unknown devices get an empty bounded deque
+    # on first write. Entries the app seeded before registration are kept.
+    def new_device_store():
+        return deque(maxlen=MAX_RECORDS_PER_DEVICE)
+    app.iot_data = defaultdict(new_device_store, getattr(app, 'iot_data', {}))
+    app.device_alerts = defaultdict(new_device_store, getattr(app, 'device_alerts', {}))
+    
+    # Guards creating a device's store so concurrent first posts don't race
+    store_lock = threading.Lock()
+    
+    def store_security_alert(device_id, event_type, details):
+        """Log an IoT security alert and add it to the device's alert list"""
+        # Determine severity based on event type
+        severity = 'critical' if event_type == 'attack_detected' else 'warning'
+        
+        # Log the security event
+        logger.info(f"SECURITY EVENT: iot_{event_type} - {json.dumps(details)}")
+        
+        # Add to security events list
+        app.log_security_event(f'iot_{event_type}', details, severity=severity)
+        
+        # Add to device-specific alerts list
+        alert_data = {
+            'ts': time.time_ns(),  # epoch nanoseconds
+            'event_type': event_type,
+            'details': details,
+            'severity': severity
+        }
+        
+        # Bounded deque drops the oldest alert once the device has 100
+        with store_lock:
+            alerts = app.device_alerts[device_id]
+        alerts.append(alert_data)
+            
+    def store_iot_data(data):
+        """Append one telemetry record, expanding delta-encoded records first"""
+        device_id = data['device_id']
+        
+        # Store the data (in a real implementation, would save to database)
+        # Bounded deque drops the oldest data point once the device has 100
+        with store_lock:
+            records = app.iot_data[device_id]
+            
+        # Delta-encoded telemetry only carries the metrics that changed,
+        # so rebuild a full record on top of the last one stored
+        if 'delta' in data:
+            previous = records[-1] if records else {}
+            data = {
+                'device_id': device_id,
+                'device_type': data.get('device_type', previous.get('device_type')),
+                'ts': data.get('ts') or time.time_ns(),
+                'metrics': {**previous.get('metrics', {}), **data['delta']}
+            }
+            
+        records.append(data)
+        
+    # Shared with the framed TCP telemetry listener
+    app.store_security_alert = store_security_alert
+    app.store_iot_data = store_iot_data
+    
     @app.route('/api/security/alert', methods=['POST', 'OPTIONS'])
     def receive_security_alert():
         """Receive security alerts from IoT devices"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
             data = request.json
             device_id = data.get('device_id')
@@ -25,34 +187,7 @@ def register_security_routes(app):
             if not device_id or not event_type:
                 return jsonify({'error': 'Missing required fields'}), 400
                 
-            # Determine severity based on event type
-            severity = 'critical' if event_type == 'attack_detected' else 'warning'
-            
-            # Log the security event
-            logger.info(f"SECURITY EVENT: iot_{event_type} - {json.dumps(details)}")
-            
-            # Add to security events list
-            if hasattr(app, 'log_security_event'):
-                app.log_security_event(f'iot_{event_type}', details, severity=severity)
-            
-            # Add to device-specific alerts list
-            if not hasattr(app, 'device_alerts'):
-                app.device_alerts = {}
-                
-            if device_id not in app.device_alerts:
-                app.device_alerts[device_id] = []
-                
-            alert_data = {
-                'timestamp': datetime.now().isoformat(),
-                'event_type': event_type,
-                'details': details,
-                'severity': severity
-            }
-            
-            app.device_alerts[device_id].append(alert_data)
-            
-            # Keep only the latest 100 alerts per device
-            app.device_alerts[device_id] = app.device_alerts[device_id][-100:]
+            store_security_alert(device_id, event_type, details)
             
             return jsonify({'status': 'success'})
             
@@ -66,92 +201,46 @@ def register_security_routes(app):
     @app.route_decorator.require_auth
     def get_iot_heatmap(device_id):
         """Get heatmap data for an IoT device"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
             # Check if we have MQTT data for this device
             # In a real implementation, this would come from a database
             # For simulation purposes, we'll generate random data
             
-            # Grid dimensions (scaled down screen resolution)
-            width = 192  # 1920 / 10
-            height = 108  # 1080 / 10
-            
-            # Create heatmap data structures
-            import numpy as np
-            
-            # Seed with device_id to get consistent results
-            import hashlib
-            seed = int(hashlib.md5(device_id.encode()).hexdigest(), 16) % 10000
-            np.random.seed(seed)
-            
-            position_heatmap = np.zeros((height, width))
-            click_heatmap = np.zeros((height, width))
-            
-            # Generate hotspots based on typical gaming patterns
-            # Center area (where most movement happens)
-            center_x = width // 2
-            center_y = height // 2
-            
-            # Add Gaussian distribution around center
-            for i in range(5000):
-                x = int(np.clip(np.random.normal(center_x, width/6), 0, width-1))
-                y = int(np.clip(np.random.normal(center_y, height/6), 0, height-1))
-                position_heatmap[y, x] += np.random.random() * 2 + 1
-                
-                # Clicks are less frequent
-                if np.random.random() < 0.3:
-                    click_heatmap[y, x] += np.random.random() * 5 + 1
-            
-            # Add hotspot in top-left (menu area)
-            for i in range(1000):
-                x = int(np.clip(np.random.normal(width/10, width/20), 0, width/5))
-                y = int(np.clip(np.random.normal(height/10, height/20), 0, height/5))
-                position_heatmap[y, x] += np.random.random() * 3 + 1
-                if np.random.random() < 0.4:
-                    click_heatmap[y, x] += np.random.random() * 8 + 2
-                    
-            # Add hotspot in bottom center (action bar area)
-            for i in range(1000):
-                x = int(np.clip(np.random.normal(center_x, width/6), center_x-width/5, center_x+width/5))
-                y = int(np.clip(np.random.normal(height*0.9, height/20), height*0.8, height-1))
-                position_heatmap[y, x] += np.random.random() * 2 + 1
-                if np.random.random() < 0.5:
-                    click_heatmap[y, x] += np.random.random() * 6 + 3
-            
-            # Add time variation (make it slightly different each time)
-            current_time = int(time.time())
-            np.random.seed(current_time % 10000)
+            width = HEATMAP_WIDTH
+            height = HEATMAP_HEIGHT
             
-            # Add some random noise
-            position_heatmap += np.random.random((height, width)) * 5
-            click_heatmap += np.random.random((height, width)) * 2
+            # Hotspots are cached per device; add time variation (slightly different each time)
+            position_base, click_base = _base_heatmaps(device_id)
+            position_noise, click_noise = _noise_pool()[int(time.time()) % NOISE_POOL_SIZE]
+            position_heatmap = _normalized_u8(position_base, position_noise)
+            click_heatmap = _normalized_u8(click_base, click_noise)
             
-            # Normalize to 0-100 range
-            position_max = np.max(position_heatmap)
-            if position_max > 0:
-                position_heatmap = (position_heatmap / position_max * 100).astype(int)
+            resolution = {
+                'width': width,
+                'height': height
+            }
+            timestamp = datetime.now().isoformat()
+            
+            # Legacy clients can still ask for nested JSON lists
+            if request.args.get('format') == 'json':
+                return jsonify({
+                    'position_heatmap': position_heatmap,
+                    'click_heatmap': click_heatmap,
+                    'resolution': resolution,
+                    'device_id': device_id,
+                    'timestamp': timestamp
+                })
                 
-            click_max = np.max(click_heatmap)
-            if click_max > 0:
-                click_heatmap = (click_heatmap / click_max * 100).astype(int)
-            
-            # Convert to Python lists for JSON serialization
-            position_list = position_heatmap.tolist()
-            click_list = click_heatmap.tolist()
-            
-            return jsonify({
-                'position_heatmap': position_list,
-                'click_heatmap': click_list,
-                'resolution': {
-                    'width': width,
-                    'height': height
-                },
+            # Default: MessagePack with each grid as raw row-major uint8 bytes
+            payload = msgpack.packb({
+                'position_heatmap': position_heatmap.tobytes(),
+                'click_heatmap': click_heatmap.tobytes(),
+                'dtype': 'u1',
+                'resolution': resolution,
                 'device_id': device_id,
-                'timestamp': datetime.now().isoformat()
-            })
+                'timestamp': timestamp
+            }, use_bin_type=True)
+            return Response(payload, mimetype='application/msgpack')
             
         except Exception as e:
             logger.error(f"Error generating heatmap data: {e}")
@@ -162,21 +251,13 @@ def register_security_routes(app):
     @app.route_decorator.require_auth
     def get_mouse_contact_heatmap(device_id):
         """Get detailed contact and pressure data from the mouse IoT sensors"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
             # In production, this would query a database for real sensor data
             # For this demo, we'll generate simulated data based on device_id for consistency
             
             # Use device_id as a seed for random data generation to ensure consistent results
-            import hashlib
-            import numpy as np
-            import time
-            
             # Create a seed from the device_id
-            seed = int(hashlib.md5(device_id.encode()).hexdigest(), 16) % 10000
+            seed = zlib.crc32(device_id.encode()) % 10000
             np.random.seed(seed)
             
             # Add some time variation to avoid completely static data
@@ -297,15 +378,9 @@ def register_security_routes(app):
     @app.route_decorator.require_auth
     def get_device_security_alerts(device_id):
         """Get security alerts for a specific device"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
-            if not hasattr(app, 'device_alerts') or device_id not in app.device_alerts:
-                return jsonify({'alerts': []})
-                
-            return jsonify({'alerts': app.device_alerts[device_id]})
+            # .get() so reads never create a store for an unknown device
+            return jsonify({'alerts': list(app.device_alerts.get(device_id, ()))})
             
         except Exception as e:
             logger.error(f"Error retrieving device alerts: {e}")
@@ -314,28 +389,18 @@ def register_security_routes(app):
     @app.route('/api/metrics/iot_data', methods=['POST', 'OPTIONS'])
     def receive_iot_data():
         """Receive IoT device data"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
-            data = request.json
+            # Devices may send compact MessagePack instead of JSON
+            if request.mimetype == 'application/msgpack':
+                data = msgpack.unpackb(request.get_data(), raw=False)
+            else:
+                data = request.json
             device_id = data.get('device_id')
             
             if not device_id:
                 return jsonify({'error': 'Missing device ID'}), 400
                 
-            # Store the data (in a real implementation, would save to database)
-            if not hasattr(app, 'iot_data'):
-                app.iot_data = {}
-                
-            if device_id not in app.iot_data:
-                app.iot_data[device_id] = []
-                
-            app.iot_data[device_id].append(data)
-            
-            # Keep only the latest 100 data points per device
-            app.iot_data[device_id] = app.iot_data[device_id][-100:]
+            store_iot_data(data)
             
             return jsonify({'status': 'success'})
             
@@ -347,15 +412,8 @@ def register_security_routes(app):
     @app.route_decorator.require_auth
     def get_iot_data(device_id):
         """Get IoT device data"""
-        # Handle OPTIONS request for CORS preflight
-        if request.method == 'OPTIONS':
-            return '', 204
-            
         try:
-            if not hasattr(app, 'iot_data') or device_id not in app.iot_data:
-                return jsonify({'data': []})
-                
-            return jsonify({'data': app.iot_data[device_id]})
+            return jsonify({'data': list(app.iot_data.get(device_id, ()))})
             
         except Exception as e:
             logger.error(f"Error retrieving IoT data: {e}")
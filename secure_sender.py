@@ -134,11 +134,12 @@ class SecureSender:
                 'data_type': 'performance_metrics'
             }
             
-            # Create request signature
-            request_data = json.dumps(payload, sort_keys=True)
+            # Create request signature over the exact body bytes that are sent,
+            # the server verifies against the raw request body
+            request_data = json.dumps(payload, sort_keys=True).encode()
             request_signature = hmac.new(
                 self.client_secret.encode(),
-                request_data.encode(),
+                request_data,
                 hashlib.sha256
             ).hexdigest()
             
@@ -146,7 +147,7 @@ class SecureSender:
                 # Send data to server
                 response = requests.post(
                     f"{self.server_url}/api/metrics/upload",
-                    json=payload,
+                    data=request_data,
                     headers={
                         'Content-Type': 'application/json',
                         'X-Client-ID': self.client_id,
@@ -1,24 +1,70 @@
+import sys
 import time
+import queue
+import atexit
+import signal
+import sched
+import socket
 import random
 import json
+import logging
 import threading
 import argparse
 import paho.mqtt.client as mqtt
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 import os
 import numpy as np
-from collections import defaultdict
+import orjson
+import msgpack
+from collections import deque
+
+# Get logger
+logger = logging.getLogger('simulated_devices')
+
+# paho limits on unacknowledged and buffered QoS 1/2 messages per client
+MAX_INFLIGHT_MESSAGES = 20
+MAX_QUEUED_MESSAGES = 200
+# Seconds connect_shared_client() waits for the broker's CONNACK
+SHARED_CONNECT_TIMEOUT = 10
+
+# Mouse movements kept for the average click distance
+MOVEMENT_WINDOW = 100
+
+# Per-tick counts of incoming messages kept for the sliding-window ping flood check
+PING_WINDOW_TICKS = 10
+
+# Average simulated attacks per second, drawn as a Poisson process
+SIMULATED_ATTACK_RATE = 0.05
+
+# Keys the simulated keyboard can press, in key_usage order
+KEY_NAMES = [chr(code) for code in range(ord('A'), ord('Z') + 1)] + ['SPACE', 'SHIFT', 'CTRL']
+
+# (epoch second, ISO string for that second) behind iso_now()
+_iso_second = (0, '')
+
+def iso_now():
+    """datetime.now().isoformat() with microseconds, formatting the date part once per second"""
+    global _iso_second
+    now = time.time()
+    second = int(now)
+    cached_second, prefix = _iso_second
+    if second != cached_second:
+        prefix = datetime.fromtimestamp(second).isoformat()
+        _iso_second = (second, prefix)
+    return f"{prefix}.{int((now - second) * 1000000):06d}"
 
 class SimulatedGamingMouse:
     """Simulates an IoT gaming mouse that sends performance data via MQTT"""
     
     def __init__(self, device_id="mouse-001", mqtt_broker="localhost", mqtt_port=1883, 
-                 mqtt_topic_prefix="iot/gaming/mouse", send_interval=1):
+                 mqtt_topic_prefix="iot/gaming/mouse", send_interval=1, batch_size=16, client=None):
         self.device_id = device_id
         self.mqtt_broker = mqtt_broker
         self.mqtt_port = mqtt_port
         self.mqtt_topic_prefix = mqtt_topic_prefix
         self.send_interval = send_interval
+        self.batch_size = batch_size  # Data samples per published message
         self.dpi = 16000
         self.polling_rate = 1000  # Hz
         self.button_count = 8
@@ -27,28 +73,51 @@ class SimulatedGamingMouse:
         self.screen_width = 1920
         self.screen_height = 1080
         
-        # Heat map data tracking
-        self.position_heatmap = np.zeros((self.screen_height//10, self.screen_width//10))
-        self.click_heatmap = np.zeros((self.screen_height//10, self.screen_width//10))
+        # Heat map data tracking (integer hit counts)
+        self.position_heatmap = np.zeros((self.screen_height//10, self.screen_width//10), dtype=np.uint32)
+        self.click_heatmap = np.zeros((self.screen_height//10, self.screen_width//10), dtype=np.uint32)
+        self._heatmap_dirty = False  # Set when counts change, cleared once published
         
         # Performance metrics
         self.clicks_per_second = 0
-        self.movement_data = []
+        # Last MOVEMENT_WINDOW movement positions as x/y ring buffers
+        self._mx = np.zeros(MOVEMENT_WINDOW, dtype=np.int32)
+        self._my = np.zeros(MOVEMENT_WINDOW, dtype=np.int32)
+        self._mi = 0    # Next slot to write
+        self._mlen = 0  # Number of valid slots
+        self._rng = np.random.default_rng()
         self.connected = False
+        self.dropped_publishes = 0  # Telemetry skipped under broker backpressure
+        self._last_data_publish = None
+        
+        # Encoded samples waiting to be published as one batch
+        self._pending = []
+        self._pending_under_attack = False  # under_attack of the newest pending sample
+        self._pending_lock = threading.Lock()
         
         # Attack detection settings - using simulation instead of raw sockets
         self.ping_count = 0
         self.ping_threshold = 50  # Pings per second before considered an attack
+        self._ping_window = np.zeros(PING_WINDOW_TICKS, dtype=np.uint32)  # Ring of recent ping counts
+        self._pw_idx = 0
         self.under_attack = False
         self.attack_start_time = None
         self.attack_cooldown = False
-        self.attack_cooldown_until = 0
+        self.attack_cooldown_seconds = 10  # No new attack this long after one ends
         self.attack_min_duration = 5  # Attack will last at least this many seconds
         
-        # Initialize MQTT client
-        self.client = mqtt.Client(client_id=f"simulated-{self.device_id}")
-        self.client.on_connect = self._on_connect
-        self.client.on_disconnect = self._on_disconnect
+        # Initialize MQTT client, or multiplex this device's topics over a shared one
+        # that the caller connects and runs
+        self._owns_client = client is None
+        if self._owns_client:
+            self.client = mqtt.Client(client_id=f"simulated-{self.device_id}")
+            # Bound paho's QoS 1/2 buffers so a slow broker can't grow memory without limit
+            self.client.max_inflight_messages_set(MAX_INFLIGHT_MESSAGES)
+            self.client.max_queued_messages_set(MAX_QUEUED_MESSAGES)
+            self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
+        else:
+            self.client = client
         
         # Set up MQTT topics
         self.data_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/data"
@@ -57,99 +126,162 @@ class SimulatedGamingMouse:
         self.control_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/control"
         self.heatmap_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/heatmap"
         
+        # Sample dict reused every tick; only the changing fields are overwritten
+        self._data_tpl = {
+            'device_id': self.device_id,
+            'session_id': None,
+            'timestamp': None,
+            'metrics': {
+                'clicks_per_second': 0,
+                'movements_count': 0,
+                'dpi': self.dpi,
+                'polling_rate': self.polling_rate,
+                'avg_click_distance': 0,
+                'button_count': self.button_count,
+                'device_temperature': 0
+            },
+            'status': {
+                'under_attack': False,
+                'attack_duration': 0,
+                'battery_level': 100,
+                'connection_quality': 100
+            }
+        }
+        # Batched messages are spliced together from already-encoded samples
+        self._batch_prefix = b'{"device_id":' + orjson.dumps(self.device_id) + b',"batch":['
+        # Security alerts fill in an encoded alert_type, timestamp and details
+        self._alert_tpl = b'{"device_id":' + orjson.dumps(self.device_id).replace(b'%', b'%%') + \
+            b',"alert_type":%b,"timestamp":"%b","details":%b}'
+        
+        # Control commands by name
+        self._cmd_dispatch = {
+            'set_dpi': self._cmd_set_dpi,
+            'set_polling_rate': self._cmd_set_polling_rate,
+            'restart': self._cmd_restart,
+            'trigger_attack': self._cmd_trigger_attack
+        }
+        
+        # Control messages are routed by topic, so devices sharing a client don't collide
+        self.client.message_callback_add(self.control_topic, self._on_message)
+        
     def _on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
         if rc == 0:
-            print(f"Connected to MQTT broker at {self.mqtt_broker}:{self.mqtt_port}")
+            logger.info("Connected to MQTT broker at %s:%s", self.mqtt_broker, self.mqtt_port)
             self.connected = True
+            self._last_data_publish = None  # Unwritten packets were discarded on reconnect
+            
+            # Small telemetry messages shouldn't wait on Nagle's algorithm
+            sock = self.client.socket()
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             # Subscribe to control topic to receive commands
             self.client.subscribe(self.control_topic)
-            self.client.on_message = self._on_message
             
             # Send initial status message
             self._publish_status("online")
         else:
-            print(f"Failed to connect to MQTT broker with code: {rc}")
+            logger.error("Failed to connect to MQTT broker with code: %s", rc)
             self.connected = False
     
     def _on_disconnect(self, client, userdata, rc):
         """Callback when disconnected from MQTT broker"""
-        print(f"Disconnected from MQTT broker with code: {rc}")
+        logger.warning("Disconnected from MQTT broker with code: %s", rc)
         self.connected = False
+        self._last_data_publish = None
     
     def _on_message(self, client, userdata, msg):
         """Callback when message is received"""
+        # Every message reaching the device, well-formed or not, counts toward the ping flood check
+        self.ping_count += 1
         try:
-            payload = json.loads(msg.payload)
+            payload = orjson.loads(msg.payload)
             if msg.topic == self.control_topic:
                 self._handle_control_message(payload)
         except json.JSONDecodeError:
-            print(f"Received malformed message: {msg.payload}")
+            logger.warning("Received malformed message: %s", msg.payload)
         except Exception as e:
-            print(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
     
     def _handle_control_message(self, payload):
         """Handle control messages from server"""
         if 'command' in payload:
             command = payload['command']
-            print(f"Received command: {command}")
-            
-            if command == 'set_dpi':
-                if 'value' in payload:
-                    self.dpi = payload['value']
-                    print(f"DPI set to {self.dpi}")
-                    self._publish_status("dpi_changed")
-            
-            elif command == 'set_polling_rate':
-                if 'value' in payload:
-                    self.polling_rate = payload['value']
-                    print(f"Polling rate set to {self.polling_rate} Hz")
-                    self._publish_status("polling_rate_changed")
-            
-            elif command == 'restart':
-                print("Restarting device...")
-                self._publish_status("restarting")
-                self.stop()
-                time.sleep(2)
-                self.start()
-            
-            elif command == 'trigger_attack':
-                duration = payload.get('duration', 5)
-                print(f"Manually triggering attack simulation for {duration} seconds")
-                self._simulate_attack(duration)
+            logger.info("Received command: %s", command)
+            
+            handler = self._cmd_dispatch.get(command)
+            if handler:
+                handler(payload)
+    
+    def _cmd_set_dpi(self, payload):
+        """Change the sensor DPI"""
+        if 'value' in payload:
+            self.dpi = payload['value']
+            logger.info("DPI set to %s", self.dpi)
+            self._publish_status("dpi_changed")
+    
+    def _cmd_set_polling_rate(self, payload):
+        """Change the USB polling rate"""
+        if 'value' in payload:
+            self.polling_rate = payload['value']
+            logger.info("Polling rate set to %s Hz", self.polling_rate)
+            self._publish_status("polling_rate_changed")
+    
+    def _cmd_restart(self, payload):
+        """Restart the simulation"""
+        logger.info("Restarting device...")
+        self._publish_status("restarting")
+        self.stop()
+        time.sleep(2)
+        self.start()
+    
+    def _cmd_trigger_attack(self, payload):
+        """Start a simulated attack on request"""
+        duration = payload.get('duration', 5)
+        logger.info("Manually triggering attack simulation for %s seconds", duration)
+        self._simulate_attack(duration)
     
     def start(self):
         """Start the simulated mouse"""
         self.running = True
         self.session_id = f"session_{int(time.time())}"
+        # Attack resolution and cooldown events don't survive a stop, so start clean
+        self.under_attack = False
+        self.attack_start_time = None
+        self.attack_cooldown = False
         
-        # Connect to MQTT broker
-        try:
-            self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
-            self.client.loop_start()
-        except Exception as e:
-            print(f"Failed to connect to MQTT broker: {e}")
-            return False
+        if self._owns_client:
+            # Connect to MQTT broker
+            try:
+                self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
+                self.client.loop_start()
+            except Exception as e:
+                logger.error("Failed to connect to MQTT broker: %s", e)
+                return False
+        else:
+            # The shared client's owner connects it and keeps self.connected current from its
+            # callbacks; until it is up, the publish paths stay idle
+            self.connected = self.client.is_connected()
+            self.client.subscribe(self.control_topic)
+            if self.connected:
+                self._publish_status("online")
         
-        # Start the main thread
-        self.main_thread = threading.Thread(target=self._run)
+        # One thread runs the data (with network monitoring), heatmap and simulated attack
+        # ticks from a scheduler; waiting on an Event lets stop() wake it early
+        self._wakeup = threading.Event()
+        self._scheduler = sched.scheduler(time.monotonic, self._wakeup.wait)
+        self._scheduler.enter(0, 1, self._run)
+        self._scheduler.enter(5, 1, self._heatmap_publisher)
+        self._scheduler.enter(random.expovariate(SIMULATED_ATTACK_RATE), 1, self._random_attack)
+        
+        self.main_thread = threading.Thread(target=self._scheduler.run)
         self.main_thread.daemon = True
         self.main_thread.start()
         
-        # Start network monitoring thread
-        self.network_thread = threading.Thread(target=self._monitor_network)
-        self.network_thread.daemon = True
-        self.network_thread.start()
-        
-        # Start heatmap thread to periodically publish heatmap data
-        self.heatmap_thread = threading.Thread(target=self._heatmap_publisher)
-        self.heatmap_thread.daemon = True
-        self.heatmap_thread.start()
-        
-        print(f"Simulated gaming mouse started with ID: {self.device_id}")
-        print(f"Session ID: {self.session_id}")
-        print(f"Simulating network traffic and attack detection...")
+        logger.info("Simulated gaming mouse started with ID: %s", self.device_id)
+        logger.info("Session ID: %s", self.session_id)
+        logger.info("Simulating network traffic and attack detection...")
         return True
         
     def stop(self):
@@ -157,23 +289,30 @@ class SimulatedGamingMouse:
         if self.running:
             self.running = False
             
-            # Publish offline status
+            # Publish any batched samples and the offline status
             if self.connected:
+                self._flush()
                 self._publish_status("offline")
                 
-            # Stop MQTT client
-            self.client.loop_stop()
-            self.client.disconnect()
+            # Stop MQTT client, unless it is shared with other devices
+            if self._owns_client:
+                self.client.loop_stop()
+                self.client.disconnect()
+            else:
+                self.client.unsubscribe(self.control_topic)
+                self.connected = False
             
-            # Wait for threads to complete
+            # Drop pending ticks and wake the scheduler so its thread exits
             if hasattr(self, 'main_thread') and self.main_thread.is_alive():
+                for event in self._scheduler.queue:
+                    try:
+                        self._scheduler.cancel(event)
+                    except ValueError:
+                        pass  # Already ran
+                self._wakeup.set()
                 self.main_thread.join(timeout=2)
-            if hasattr(self, 'network_thread') and self.network_thread.is_alive():
-                self.network_thread.join(timeout=2)
-            if hasattr(self, 'heatmap_thread') and self.heatmap_thread.is_alive():
-                self.heatmap_thread.join(timeout=2)
                 
-            print("Simulated gaming mouse stopped")
+            logger.info("Simulated gaming mouse stopped")
         
     def _generate_performance_data(self):
         """Generate simulated performance data"""
@@ -184,43 +323,43 @@ class SimulatedGamingMouse:
         else:  # Non-gaming hours
             self.clicks_per_second = random.randint(0, 2)
             
-        # Generate mouse movement data (x, y coordinates)
-        for _ in range(self.clicks_per_second):
-            x = random.randint(0, self.screen_width)
-            y = random.randint(0, self.screen_height)
-            
-            # Update heat maps
-            # Scale down to smaller grid for the heat map
-            grid_x = min(x // 10, self.position_heatmap.shape[1]-1)
-            grid_y = min(y // 10, self.position_heatmap.shape[0]-1)
-            
-            # Update position heatmap (all movements)
-            self.position_heatmap[grid_y, grid_x] += 1
-            
-            # Update click heatmap (only clicks)
-            if random.random() < 0.3:  # 30% chance this movement has a click
-                self.click_heatmap[grid_y, grid_x] += 1
-            
-            self.movement_data.append({
-                'x': x,
-                'y': y,
-                'timestamp': time.time()
-            })
-            
-        # Keep only the last 100 movement records
-        self.movement_data = self.movement_data[-100:]
+        # Generate mouse movement data (x, y coordinates) for the whole tick at once
+        count = self.clicks_per_second
+        xs = self._rng.integers(0, self.screen_width, count, dtype=np.int32, endpoint=True)
+        ys = self._rng.integers(0, self.screen_height, count, dtype=np.int32, endpoint=True)
         
+        # Update heat maps
+        # Scale down to smaller grid for the heat map
+        height, width = self.position_heatmap.shape
+        cells = np.minimum(ys // 10, height - 1) * width + np.minimum(xs // 10, width - 1)
+        
+        # Update position heatmap (all movements)
+        # Unbuffered in-place add on the flat view, touching only the visited cells
+        np.add.at(self.position_heatmap.ravel(), cells, 1)
+        
+        # Update click heatmap (only clicks)
+        clicked = self._rng.random(count) < 0.3  # 30% chance each movement has a click
+        np.add.at(self.click_heatmap.ravel(), cells[clicked], 1)
+        if count:
+            self._heatmap_dirty = True
+        
+        slots = (self._mi + np.arange(count)) % MOVEMENT_WINDOW
+        self._mx[slots] = xs
+        self._my[slots] = ys
+        self._mi = (self._mi + count) % MOVEMENT_WINDOW
+        self._mlen = min(self._mlen + count, MOVEMENT_WINDOW)
+            
         # Advanced metrics specific to gaming mice
         avg_click_distance = 0
-        if len(self.movement_data) > 1:
-            distances = []
-            for i in range(1, len(self.movement_data)):
-                prev = self.movement_data[i-1]
-                curr = self.movement_data[i]
-                distance = ((curr['x'] - prev['x'])**2 + (curr['y'] - prev['y'])**2)**0.5
-                distances.append(distance)
-            if distances:
-                avg_click_distance = sum(distances) / len(distances)
+        if self._mlen > 1:
+            # Distances between consecutive movements, oldest first
+            if self._mlen < MOVEMENT_WINDOW:
+                xs = self._mx[:self._mlen]
+                ys = self._my[:self._mlen]
+            else:
+                xs = np.concatenate((self._mx[self._mi:], self._mx[:self._mi]))
+                ys = np.concatenate((self._my[self._mi:], self._my[:self._mi]))
+            avg_click_distance = float(np.hypot(np.diff(xs), np.diff(ys)).mean())
         
         # Add some thermal data based on activity level (innovative feature)
         base_temp = 28.0  # Base temperature in °C
@@ -231,61 +370,95 @@ class SimulatedGamingMouse:
         if self.under_attack:
             device_temperature += 3.5  # Attack causes additional heat
         
-        return {
-            'device_id': self.device_id,
-            'session_id': self.session_id,
-            'timestamp': datetime.now().isoformat(),
-            'metrics': {
-                'clicks_per_second': self.clicks_per_second,
-                'movements_count': len(self.movement_data),
-                'dpi': self.dpi,
-                'polling_rate': self.polling_rate,
-                'avg_click_distance': round(avg_click_distance, 2),
-                'button_count': self.button_count,
-                'device_temperature': round(device_temperature, 1)
-            },
-            'status': {
-                'under_attack': self.under_attack,
-                'attack_duration': self._get_attack_duration() if self.under_attack else 0,
-                'battery_level': random.randint(20, 100),  # Simulate battery level
-                'connection_quality': random.randint(70, 100) if not self.under_attack else random.randint(30, 60)
-            }
-        }
+        # Fill in the reused sample dict; callers must encode it before the next tick
+        data = self._data_tpl
+        data['session_id'] = self.session_id
+        data['timestamp'] = iso_now()
+        metrics = data['metrics']
+        metrics['clicks_per_second'] = self.clicks_per_second
+        metrics['movements_count'] = self._mlen
+        metrics['dpi'] = self.dpi
+        metrics['polling_rate'] = self.polling_rate
+        metrics['avg_click_distance'] = round(avg_click_distance, 2)
+        metrics['device_temperature'] = round(device_temperature, 1)
+        status = data['status']
+        status['under_attack'] = self.under_attack
+        status['attack_duration'] = self._get_attack_duration() if self.under_attack else 0
+        status['battery_level'] = random.randint(20, 100)  # Simulate battery level
+        status['connection_quality'] = random.randint(70, 100) if not self.under_attack else random.randint(30, 60)
+        return data
         
     def _get_attack_duration(self):
         """Calculate attack duration in seconds"""
         if self.attack_start_time:
-            return int(time.time() - self.attack_start_time)
+            return int(time.monotonic() - self.attack_start_time)
         return 0
     
-    def _publish_data(self, data):
-        """Publish data via MQTT"""
+    def _publish_data(self, payload):
+        """Publish an encoded data message via MQTT"""
         if not self.connected:
             return False
             
         try:
-            payload = json.dumps(data)
-            result = self.client.publish(self.data_topic, payload, qos=1)
-            return result.rc == mqtt.MQTT_ERR_SUCCESS
+            # QoS 0 packets bypass paho's queue limit; if this device's previous one hasn't been
+            # written yet the connection is backing up, so drop this sample rather than buffer it
+            if self._last_data_publish is not None and not self._last_data_publish.is_published():
+                self.dropped_publishes += 1
+                return False
+                
+            # Telemetry is lossy by nature; QoS 0 avoids a PUBACK round-trip per message
+            result = self.client.publish(self.data_topic, payload, qos=0)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Never queued, so there is nothing to wait for
+                return False
+            self._last_data_publish = result
+            return True
         except Exception as e:
-            print(f"Error publishing data: {e}")
+            logger.error("Error publishing data: %s", e)
             return False
     
+    def _queue_data(self, data):
+        """Encode a sample into the pending batch, flushing when it is full"""
+        sample = orjson.dumps(data)
+        under_attack = data['status']['under_attack']
+        with self._pending_lock:
+            # An attack starting or ending goes out right away instead of waiting for a full batch
+            attack_changed = bool(self._pending) and self._pending_under_attack != under_attack
+            self._pending.append(sample)
+            self._pending_under_attack = under_attack
+            if len(self._pending) < self.batch_size and not attack_changed:
+                return
+            batch = self._pending
+            self._pending = []
+        self._publish_batch(batch)
+    
+    def _flush(self):
+        """Publish whatever samples are pending"""
+        with self._pending_lock:
+            batch = self._pending
+            self._pending = []
+        if batch:
+            self._publish_batch(batch)
+    
+    def _publish_batch(self, batch):
+        """Publish several encoded samples as one {'device_id', 'batch'} message"""
+        return self._publish_data(self._batch_prefix + b','.join(batch) + b']}')
+    
     def _publish_status(self, status):
         """Publish device status via MQTT"""
         if not self.connected and status != "offline":
             return False
             
         try:
-            payload = json.dumps({
+            payload = orjson.dumps({
                 'device_id': self.device_id,
                 'status': status,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_now()
             })
             result = self.client.publish(self.status_topic, payload, qos=1, retain=True)
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing status: {e}")
+            logger.error("Error publishing status: %s", e)
             return False
     
     def _publish_security_alert(self, alert_type, details):
@@ -294,16 +467,11 @@ class SimulatedGamingMouse:
             return False
             
         try:
-            payload = json.dumps({
-                'device_id': self.device_id,
-                'alert_type': alert_type,
-                'timestamp': datetime.now().isoformat(),
-                'details': details
-            })
+            payload = self._alert_tpl % (orjson.dumps(alert_type), iso_now().encode(), orjson.dumps(details))
             result = self.client.publish(self.security_topic, payload, qos=2)  # Use QoS 2 for security alerts
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing security alert: {e}")
+            logger.error("Error publishing security alert: %s", e)
             return False
     
     def _publish_heatmap(self):
@@ -312,46 +480,57 @@ class SimulatedGamingMouse:
             return False
             
         try:
-            # Normalize heatmaps for better visualization
-            position_max = max(1, np.max(self.position_heatmap))
-            click_max = max(1, np.max(self.click_heatmap))
-            
-            normalized_position = (self.position_heatmap / position_max * 100).astype(int).tolist()
-            normalized_clicks = (self.click_heatmap / click_max * 100).astype(int).tolist()
-            
-            payload = json.dumps({
+            # Only the visited cells are sent, as raw little-endian arrays in a MessagePack map:
+            # *_cells are uint16 flat indices into the height x width grid and *_values the
+            # matching uint8 counts normalized to 0-100, read back with np.frombuffer
+            position_cells, position_values = self._sparse_normalized(self.position_heatmap)
+            click_cells, click_values = self._sparse_normalized(self.click_heatmap)
+            payload = msgpack.packb({
                 'device_id': self.device_id,
-                'timestamp': datetime.now().isoformat(),
-                'position_heatmap': normalized_position,
-                'click_heatmap': normalized_clicks,
-                'resolution': {
-                    'width': self.screen_width // 10,
-                    'height': self.screen_height // 10
-                }
-            })
-            result = self.client.publish(self.heatmap_topic, payload, qos=1)
+                'timestamp': iso_now(),
+                'shape': self.position_heatmap.shape,
+                'position_cells': position_cells.tobytes(),
+                'position_values': position_values.tobytes(),
+                'click_cells': click_cells.tobytes(),
+                'click_values': click_values.tobytes()
+            }, use_bin_type=True)
+            result = self.client.publish(self.heatmap_topic, payload, qos=0)
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing heatmap data: {e}")
+            logger.error("Error publishing heatmap data: %s", e)
             return False
     
+    @staticmethod
+    def _sparse_normalized(heatmap):
+        """Non-zero cells of a count grid as (uint16 flat indices, uint8 values scaled to 0-100)"""
+        cells = np.flatnonzero(heatmap)
+        counts = heatmap.ravel()[cells]
+        if counts.size:
+            # Integer arithmetic, only over the cells that are sent
+            counts = counts * 100 // int(counts.max())
+        return cells.astype('<u2'), counts.astype(np.uint8)
+    
     def _heatmap_publisher(self):
-        """Thread that periodically publishes heatmap data"""
-        while self.running:
-            try:
-                # Publish every 5 seconds
-                time.sleep(5)
-                self._publish_heatmap()
-            except Exception as e:
-                print(f"Error in heatmap publisher: {e}")
+        """Scheduled every 5 seconds to publish heatmap data"""
+        if not self.running:
+            return
+        try:
+            # Only publish if the heatmaps changed since the last publish
+            if self._heatmap_dirty:
+                self._heatmap_dirty = False
+                if not self._publish_heatmap():
+                    self._heatmap_dirty = True
+        except Exception as e:
+            logger.error("Error in heatmap publisher: %s", e)
+        self._scheduler.enter(5, 1, self._heatmap_publisher)
     
     def _simulate_attack(self, duration=5):
         """Simulate an attack for a specific duration"""
         if not self.under_attack:
             self.under_attack = True
-            self.attack_start_time = time.time()
+            self.attack_start_time = time.monotonic()
             attack_intensity = random.randint(70, 100)
-            print(f"⚠️ ALERT: Device is under attack! Received {attack_intensity} pings in 1 second")
+            logger.warning("⚠️ ALERT: Device is under attack! Received %s pings in 1 second", attack_intensity)
             
             # Publish attack alert
             self._publish_security_alert('attack_detected', {
@@ -361,86 +540,115 @@ class SimulatedGamingMouse:
             })
             
             # Schedule attack resolution after the specified duration
-            def resolve_attack():
-                time.sleep(duration)
-                if self.under_attack:
-                    attack_duration = self._get_attack_duration()
-                    self.under_attack = False
-                    self.attack_start_time = None
-                    print(f"✓ Attack stopped. Duration: {attack_duration} seconds")
-                    
-                    # Publish attack resolved alert
-                    self._publish_security_alert('attack_resolved', {
-                        'attack_type': 'ping_flood',
-                        'duration': attack_duration
-                    })
-                    
-                    # Set cooldown to prevent immediate re-attack
-                    self.attack_cooldown = True
-                    self.attack_cooldown_until = time.time() + 10  # 10 second cooldown
-                
-            # Start thread to resolve attack after duration
-            attack_thread = threading.Thread(target=resolve_attack)
-            attack_thread.daemon = True
-            attack_thread.start()
-    
-    def _monitor_network(self):
-        """Simulated network monitoring that doesn't rely on raw sockets"""
-        while self.running:
-            try:
-                # Reset ping counter every second
-                self.ping_count = 0
-                
-                # If in cooldown period, skip attack chance
-                if self.attack_cooldown and time.time() > self.attack_cooldown_until:
-                    self.attack_cooldown = False
-                
-                # For simulation purposes, occasionally simulate an attack
-                # 5% chance of simulated attack if not in cooldown and not already under attack
-                if not self.under_attack and not self.attack_cooldown and random.random() < 0.05:
-                    self._simulate_attack(random.randint(5, 10))  # Random duration between 5-10 seconds
-                    
-                # Sleep for a second to simulate the monitoring period
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error monitoring network: {e}")
-                time.sleep(1)
+            self._scheduler.enter(duration, 1, self._resolve_attack)
+    
+    def _resolve_attack(self):
+        """Scheduled to end a simulated attack once its duration has passed"""
+        if self.under_attack:
+            attack_duration = self._get_attack_duration()
+            self.under_attack = False
+            self.attack_start_time = None
+            logger.info("✓ Attack stopped. Duration: %s seconds", attack_duration)
+            
+            # Publish attack resolved alert
+            self._publish_security_alert('attack_resolved', {
+                'attack_type': 'ping_flood',
+                'duration': attack_duration
+            })
+            
+            # Set cooldown to prevent immediate re-attack; it is cleared by a scheduled event
+            self.attack_cooldown = True
+            self._scheduler.enter(self.attack_cooldown_seconds, 1, self._end_cooldown)
+    
+    def _end_cooldown(self):
+        """Scheduled to allow simulated attacks again once the cooldown has passed"""
+        self.attack_cooldown = False
+    
+    def _random_attack(self):
+        """Scheduled at exponentially distributed intervals to start a simulated attack"""
+        if not self.running:
+            return
+        try:
+            # For simulation purposes, occasionally simulate an attack if not in cooldown and not already under attack
+            if not self.under_attack and not self.attack_cooldown:
+                self._simulate_attack(random.randint(5, 10))  # Random duration between 5-10 seconds
+        except Exception as e:
+            logger.error("Error simulating attack: %s", e)
+        self._scheduler.enter(random.expovariate(SIMULATED_ATTACK_RATE), 1, self._random_attack)
+    
+    def _network_tick(self):
+        """Simulated network monitoring that doesn't rely on raw sockets, run with each data tick"""
+        # Move this tick's ping count into the window, then reset the counter
+        self._ping_window[self._pw_idx] = self.ping_count
+        self._pw_idx = (self._pw_idx + 1) % PING_WINDOW_TICKS
+        self.ping_count = 0
+        
+        # If in cooldown period, skip attack chance
+        if self.under_attack or self.attack_cooldown:
+            return
+        
+        # A sustained burst counts as a flood: over the whole window (PING_WINDOW_TICKS data ticks)
+        # the average rate is more than half of ping_threshold pings per second
+        window_seconds = PING_WINDOW_TICKS * self.send_interval
+        if self._ping_window.sum() / window_seconds > self.ping_threshold / 2:
+            self._simulate_attack(random.randint(5, 10))
     
     def _run(self):
-        """Main execution loop"""
-        while self.running:
-            # Generate and publish performance data
+        """Main data tick, scheduled every send_interval seconds"""
+        if not self.running:
+            return
+        try:
+            self._network_tick()
+        except Exception as e:
+            logger.error("Error monitoring network: %s", e)
+        try:
+            # Generate performance data; it is published in batches
             data = self._generate_performance_data()
-            self._publish_data(data)
-            
-            # Sleep for the specified interval
-            time.sleep(self.send_interval)
+            self._queue_data(data)
+        except Exception as e:
+            logger.error("Error generating data: %s", e)
+        self._scheduler.enter(self.send_interval, 1, self._run)
 
 
 class SimulatedGamingKeyboard:
     """Simulates an IoT gaming keyboard that sends performance data via MQTT"""
     
     def __init__(self, device_id="keyboard-001", mqtt_broker="localhost", mqtt_port=1883, 
-                 mqtt_topic_prefix="iot/gaming/keyboard", send_interval=1):
+                 mqtt_topic_prefix="iot/gaming/keyboard", send_interval=1, batch_size=16, client=None,
+                 max_messages=100, max_delay_ms=5000):
         self.device_id = device_id
         self.mqtt_broker = mqtt_broker
         self.mqtt_port = mqtt_port
         self.mqtt_topic_prefix = mqtt_topic_prefix
         self.send_interval = send_interval
+        self.batch_size = batch_size  # Data samples per published message
+        self.max_messages = max_messages  # Keypresses that trigger an early keymap publish
+        self.max_delay_ms = max_delay_ms  # Longest a changed keymap waits to be published
         self.polling_rate = 1000  # Hz
         self.key_count = 104      # Full keyboard with numpad
         self.running = False
         self.session_id = None
         
-        # Key usage tracking
-        self.key_usage = defaultdict(int)
+        # Key usage tracking: press counts indexed like KEY_NAMES
+        self.key_usage = np.zeros(len(KEY_NAMES), dtype=np.int64)
         self.commonly_used_keys = ['W', 'A', 'S', 'D', 'SPACE', 'SHIFT', 'CTRL', 'E', 'R', 'F']
+        self._keymap_dirty_count = 0  # Keypresses since the keymap was last published
+        self._keymap_event = None  # Pending timed keymap publish
+        self._key_names = np.array(KEY_NAMES)
+        self._common_key_indices = np.array([KEY_NAMES.index(key) for key in self.commonly_used_keys])
+        self._rng = np.random.default_rng()
         
         # Performance metrics
         self.keypresses_per_second = 0
-        self.key_events = []
+        self.key_events = deque(maxlen=200)  # Last 200 (key, event_type, timestamp) events
         self.connected = False
+        self.dropped_publishes = 0  # Telemetry skipped under broker backpressure
+        self._last_data_publish = None
+        
+        # Encoded samples waiting to be published as one batch
+        self._pending = []
+        self._pending_under_attack = False  # under_attack of the newest pending sample
+        self._pending_lock = threading.Lock()
         
         # Attack detection settings
         self.suspicious_events = 0
@@ -448,7 +656,7 @@ class SimulatedGamingKeyboard:
         self.under_attack = False
         self.attack_start_time = None
         self.attack_cooldown = False
-        self.attack_cooldown_until = 0
+        self.attack_cooldown_seconds = 10  # No new attack this long after one ends
         self.attack_min_duration = 5  # Attack will last at least this many seconds
         
         # Keyboard illumination and effects
@@ -456,10 +664,18 @@ class SimulatedGamingKeyboard:
         self.illumination_color = "rgb(255, 0, 0)"  # Default red color
         self.illumination_brightness = 80  # 0-100
         
-        # Initialize MQTT client
-        self.client = mqtt.Client(client_id=f"simulated-{self.device_id}")
-        self.client.on_connect = self._on_connect
-        self.client.on_disconnect = self._on_disconnect
+        # Initialize MQTT client, or multiplex this device's topics over a shared one
+        # that the caller connects and runs
+        self._owns_client = client is None
+        if self._owns_client:
+            self.client = mqtt.Client(client_id=f"simulated-{self.device_id}")
+            # Bound paho's QoS 1/2 buffers so a slow broker can't grow memory without limit
+            self.client.max_inflight_messages_set(MAX_INFLIGHT_MESSAGES)
+            self.client.max_queued_messages_set(MAX_QUEUED_MESSAGES)
+            self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
+        else:
+            self.client = client
         
         # Set up MQTT topics
         self.data_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/data"
@@ -468,100 +684,168 @@ class SimulatedGamingKeyboard:
         self.control_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/control"
         self.keymap_topic = f"{self.mqtt_topic_prefix}/{self.device_id}/keymap"
         
+        # Sample dict reused every tick; only the changing fields are overwritten
+        self._data_tpl = {
+            'device_id': self.device_id,
+            'session_id': None,
+            'timestamp': None,
+            'metrics': {
+                'keypresses_per_second': 0,
+                'keys_pressed_count': 0,
+                'avg_hold_duration_ms': 0,
+                'polling_rate': self.polling_rate,
+                'current_rollover': 0,
+                'max_rollover': 10,  # N-key rollover capability
+                'device_temperature': 0
+            },
+            'status': {
+                'under_attack': False,
+                'attack_duration': 0,
+                'battery_level': 100,  # Usually wired, but could be wireless
+                'connection_quality': 100,
+                'illumination': {
+                    'mode': self.illumination_mode,
+                    'color': self.illumination_color,
+                    'brightness': self.illumination_brightness
+                }
+            }
+        }
+        
+        # Messages are spliced onto the constant '{"device_id":...' opening, encoded once
+        self._envelope_prefix = orjson.dumps({'device_id': self.device_id})[:-1]
+        self._batch_prefix = self._envelope_prefix + b',"batch":['
+        # Security alerts fill in an encoded alert_type, timestamp and details
+        self._alert_tpl = self._envelope_prefix.replace(b'%', b'%%') + \
+            b',"alert_type":%b,"timestamp":"%b","details":%b}'
+        
+        # Control commands by name
+        self._cmd_dispatch = {
+            'set_illumination': self._cmd_set_illumination,
+            'set_polling_rate': self._cmd_set_polling_rate,
+            'restart': self._cmd_restart,
+            'trigger_attack': self._cmd_trigger_attack
+        }
+        
+        # Control messages are routed by topic, so devices sharing a client don't collide
+        self.client.message_callback_add(self.control_topic, self._on_message)
+        
     def _on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
         if rc == 0:
-            print(f"Connected to MQTT broker at {self.mqtt_broker}:{self.mqtt_port}")
+            logger.info("Connected to MQTT broker at %s:%s", self.mqtt_broker, self.mqtt_port)
             self.connected = True
+            self._last_data_publish = None  # Unwritten packets were discarded on reconnect
+            
+            # Small telemetry messages shouldn't wait on Nagle's algorithm
+            sock = self.client.socket()
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             # Subscribe to control topic to receive commands
             self.client.subscribe(self.control_topic)
-            self.client.on_message = self._on_message
             
             # Send initial status message
             self._publish_status("online")
         else:
-            print(f"Failed to connect to MQTT broker with code: {rc}")
+            logger.error("Failed to connect to MQTT broker with code: %s", rc)
             self.connected = False
     
     def _on_disconnect(self, client, userdata, rc):
         """Callback when disconnected from MQTT broker"""
-        print(f"Disconnected from MQTT broker with code: {rc}")
+        logger.warning("Disconnected from MQTT broker with code: %s", rc)
         self.connected = False
+        self._last_data_publish = None
     
     def _on_message(self, client, userdata, msg):
         """Callback when message is received"""
         try:
-            payload = json.loads(msg.payload)
+            payload = orjson.loads(msg.payload)
             if msg.topic == self.control_topic:
                 self._handle_control_message(payload)
         except json.JSONDecodeError:
-            print(f"Received malformed message: {msg.payload}")
+            logger.warning("Received malformed message: %s", msg.payload)
         except Exception as e:
-            print(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
     
     def _handle_control_message(self, payload):
         """Handle control messages from server"""
         if 'command' in payload:
             command = payload['command']
-            print(f"Received command: {command}")
-            
-            if command == 'set_illumination':
-                self.illumination_mode = payload.get('mode', self.illumination_mode)
-                self.illumination_color = payload.get('color', self.illumination_color)
-                self.illumination_brightness = payload.get('brightness', self.illumination_brightness)
-                print(f"Illumination set to {self.illumination_mode} mode, {self.illumination_color}, {self.illumination_brightness}% brightness")
-                self._publish_status("illumination_changed")
-            
-            elif command == 'set_polling_rate':
-                if 'value' in payload:
-                    self.polling_rate = payload['value']
-                    print(f"Polling rate set to {self.polling_rate} Hz")
-                    self._publish_status("polling_rate_changed")
-            
-            elif command == 'restart':
-                print("Restarting device...")
-                self._publish_status("restarting")
-                self.stop()
-                time.sleep(2)
-                self.start()
-            
-            elif command == 'trigger_attack':
-                duration = payload.get('duration', 5)
-                print(f"Manually triggering attack simulation for {duration} seconds")
-                self._simulate_attack(duration)
+            logger.info("Received command: %s", command)
+            
+            handler = self._cmd_dispatch.get(command)
+            if handler:
+                handler(payload)
+    
+    def _cmd_set_illumination(self, payload):
+        """Change the illumination mode, color and brightness"""
+        self.illumination_mode = payload.get('mode', self.illumination_mode)
+        self.illumination_color = payload.get('color', self.illumination_color)
+        self.illumination_brightness = payload.get('brightness', self.illumination_brightness)
+        logger.info("Illumination set to %s mode, %s, %s%% brightness", self.illumination_mode, self.illumination_color, self.illumination_brightness)
+        self._publish_status("illumination_changed")
+    
+    def _cmd_set_polling_rate(self, payload):
+        """Change the USB polling rate"""
+        if 'value' in payload:
+            self.polling_rate = payload['value']
+            logger.info("Polling rate set to %s Hz", self.polling_rate)
+            self._publish_status("polling_rate_changed")
+    
+    def _cmd_restart(self, payload):
+        """Restart the simulation"""
+        logger.info("Restarting device...")
+        self._publish_status("restarting")
+        self.stop()
+        time.sleep(2)
+        self.start()
+    
+    def _cmd_trigger_attack(self, payload):
+        """Start a simulated attack on request"""
+        duration = payload.get('duration', 5)
+        logger.info("Manually triggering attack simulation for %s seconds", duration)
+        self._simulate_attack(duration)
     
     def start(self):
         """Start the simulated keyboard"""
         self.running = True
         self.session_id = f"session_{int(time.time())}"
+        # Attack resolution and cooldown events don't survive a stop, so start clean
+        self.under_attack = False
+        self.attack_start_time = None
+        self.attack_cooldown = False
         
-        # Connect to MQTT broker
-        try:
-            self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
-            self.client.loop_start()
-        except Exception as e:
-            print(f"Failed to connect to MQTT broker: {e}")
-            return False
+        if self._owns_client:
+            # Connect to MQTT broker
+            try:
+                self.client.connect(self.mqtt_broker, self.mqtt_port, 60)
+                self.client.loop_start()
+            except Exception as e:
+                logger.error("Failed to connect to MQTT broker: %s", e)
+                return False
+        else:
+            # The shared client's owner connects it and keeps self.connected current from its
+            # callbacks; until it is up, the publish paths stay idle
+            self.connected = self.client.is_connected()
+            self.client.subscribe(self.control_topic)
+            if self.connected:
+                self._publish_status("online")
+        
+        # One thread runs the data (with network monitoring), keymap and simulated attack
+        # ticks from a scheduler; waiting on an Event lets stop() wake it early
+        self._wakeup = threading.Event()
+        self._scheduler = sched.scheduler(time.monotonic, self._wakeup.wait)
+        self._scheduler.enter(0, 1, self._run)
+        self._keymap_event = self._scheduler.enter(self.max_delay_ms / 1000, 1, self._keymap_publisher)
+        self._scheduler.enter(random.expovariate(SIMULATED_ATTACK_RATE), 1, self._random_attack)
         
-        # Start the main thread
-        self.main_thread = threading.Thread(target=self._run)
+        self.main_thread = threading.Thread(target=self._scheduler.run)
         self.main_thread.daemon = True
         self.main_thread.start()
         
-        # Start network monitoring thread
-        self.network_thread = threading.Thread(target=self._monitor_network)
-        self.network_thread.daemon = True
-        self.network_thread.start()
-        
-        # Start keymap thread to periodically publish keymap data
-        self.keymap_thread = threading.Thread(target=self._keymap_publisher)
-        self.keymap_thread.daemon = True
-        self.keymap_thread.start()
-        
-        print(f"Simulated gaming keyboard started with ID: {self.device_id}")
-        print(f"Session ID: {self.session_id}")
-        print(f"Simulating keyboard activity and attack detection...")
+        logger.info("Simulated gaming keyboard started with ID: %s", self.device_id)
+        logger.info("Session ID: %s", self.session_id)
+        logger.info("Simulating keyboard activity and attack detection...")
         return True
         
     def stop(self):
@@ -569,23 +853,30 @@ class SimulatedGamingKeyboard:
         if self.running:
             self.running = False
             
-            # Publish offline status
+            # Publish any batched samples and the offline status
             if self.connected:
+                self._flush()
                 self._publish_status("offline")
                 
-            # Stop MQTT client
-            self.client.loop_stop()
-            self.client.disconnect()
+            # Stop MQTT client, unless it is shared with other devices
+            if self._owns_client:
+                self.client.loop_stop()
+                self.client.disconnect()
+            else:
+                self.client.unsubscribe(self.control_topic)
+                self.connected = False
             
-            # Wait for threads to complete
+            # Drop pending ticks and wake the scheduler so its thread exits
             if hasattr(self, 'main_thread') and self.main_thread.is_alive():
+                for event in self._scheduler.queue:
+                    try:
+                        self._scheduler.cancel(event)
+                    except ValueError:
+                        pass  # Already ran
+                self._wakeup.set()
                 self.main_thread.join(timeout=2)
-            if hasattr(self, 'network_thread') and self.network_thread.is_alive():
-                self.network_thread.join(timeout=2)
-            if hasattr(self, 'keymap_thread') and self.keymap_thread.is_alive():
-                self.keymap_thread.join(timeout=2)
                 
-            print("Simulated gaming keyboard stopped")
+            logger.info("Simulated gaming keyboard stopped")
     
     def _generate_performance_data(self):
         """Generate simulated performance data"""
@@ -596,27 +887,23 @@ class SimulatedGamingKeyboard:
         else:  # Non-gaming hours
             self.keypresses_per_second = random.randint(0, 3)
             
-        # Generate key press data
-        for _ in range(self.keypresses_per_second):
+        # Generate key press data for the whole second at once
+        count = self.keypresses_per_second
+        if count:
             # Weighted random choice - common gaming keys are more likely
-            if random.random() < 0.8:
-                key = random.choice(self.commonly_used_keys)
-            else:
-                key = chr(random.randint(65, 90))  # Random A-Z
+            is_common = self._rng.random(count) < 0.8
+            commons = self._common_key_indices[self._rng.integers(0, len(self._common_key_indices), count)]
+            rares = self._rng.integers(0, 26, count)  # Random A-Z
+            keys = np.where(is_common, commons, rares)
             
-            # Update key usage count
-            self.key_usage[key] += 1
+            # Update key usage counts
+            self._keymap_dirty_count += count
+            self.key_usage += np.bincount(keys, minlength=len(KEY_NAMES))
             
-            # Record key event
-            self.key_events.append({
-                'key': key,
-                'event_type': 'press' if random.random() < 0.5 else 'release',
-                'timestamp': time.time()
-            })
+            # Record key events as (key, event_type, timestamp)
+            event_types = np.where(self._rng.random(count) < 0.5, 'press', 'release')
+            self.key_events.extend(zip(self._key_names[keys].tolist(), event_types.tolist(), [time.time()] * count))
             
-        # Keep only the latest 200 key events
-        self.key_events = self.key_events[-200:]
-        
         # Calculate key hold duration (time between press and release)
         avg_hold_duration = random.uniform(80, 150)  # milliseconds
         
@@ -632,84 +919,115 @@ class SimulatedGamingKeyboard:
         if self.under_attack:
             device_temperature += 3.0  # Attack causes additional heat
         
-        return {
-            'device_id': self.device_id,
-            'session_id': self.session_id,
-            'timestamp': datetime.now().isoformat(),
-            'metrics': {
-                'keypresses_per_second': self.keypresses_per_second,
-                'keys_pressed_count': len(self.key_events),
-                'avg_hold_duration_ms': round(avg_hold_duration, 1),
-                'polling_rate': self.polling_rate,
-                'current_rollover': current_rollover,
-                'max_rollover': 10,  # N-key rollover capability
-                'device_temperature': round(device_temperature, 1)
-            },
-            'status': {
-                'under_attack': self.under_attack,
-                'attack_duration': self._get_attack_duration() if self.under_attack else 0,
-                'battery_level': 100,  # Usually wired, but could be wireless
-                'connection_quality': random.randint(80, 100) if not self.under_attack else random.randint(40, 70),
-                'illumination': {
-                    'mode': self.illumination_mode,
-                    'color': self.illumination_color,
-                    'brightness': self.illumination_brightness
-                }
-            }
-        }
+        # Fill in the reused sample dict; callers must encode it before the next tick
+        data = self._data_tpl
+        data['session_id'] = self.session_id
+        data['timestamp'] = iso_now()
+        metrics = data['metrics']
+        metrics['keypresses_per_second'] = self.keypresses_per_second
+        metrics['keys_pressed_count'] = len(self.key_events)
+        metrics['avg_hold_duration_ms'] = round(avg_hold_duration, 1)
+        metrics['polling_rate'] = self.polling_rate
+        metrics['current_rollover'] = current_rollover
+        metrics['device_temperature'] = round(device_temperature, 1)
+        status = data['status']
+        status['under_attack'] = self.under_attack
+        status['attack_duration'] = self._get_attack_duration() if self.under_attack else 0
+        status['connection_quality'] = random.randint(80, 100) if not self.under_attack else random.randint(40, 70)
+        illumination = status['illumination']
+        illumination['mode'] = self.illumination_mode
+        illumination['color'] = self.illumination_color
+        illumination['brightness'] = self.illumination_brightness
+        return data
         
     def _get_attack_duration(self):
         """Calculate attack duration in seconds"""
         if self.attack_start_time:
-            return int(time.time() - self.attack_start_time)
+            return int(time.monotonic() - self.attack_start_time)
         return 0
     
-    def _publish_data(self, data):
-        """Publish data via MQTT"""
+    def _publish_data(self, payload):
+        """Publish an encoded data message via MQTT"""
         if not self.connected:
             return False
             
         try:
-            payload = json.dumps(data)
-            result = self.client.publish(self.data_topic, payload, qos=1)
-            return result.rc == mqtt.MQTT_ERR_SUCCESS
+            # QoS 0 packets bypass paho's queue limit; if this device's previous one hasn't been
+            # written yet the connection is backing up, so drop this sample rather than buffer it
+            if self._last_data_publish is not None and not self._last_data_publish.is_published():
+                self.dropped_publishes += 1
+                return False
+                
+            # Telemetry is lossy by nature; QoS 0 avoids a PUBACK round-trip per message
+            result = self.client.publish(self.data_topic, payload, qos=0)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Never queued, so there is nothing to wait for
+                return False
+            self._last_data_publish = result
+            return True
         except Exception as e:
-            print(f"Error publishing data: {e}")
+            logger.error("Error publishing data: %s", e)
             return False
     
+    def _queue_data(self, data):
+        """Encode a sample into the pending batch, flushing when it is full"""
+        sample = orjson.dumps(data)
+        under_attack = data['status']['under_attack']
+        with self._pending_lock:
+            # An attack starting or ending goes out right away instead of waiting for a full batch
+            attack_changed = bool(self._pending) and self._pending_under_attack != under_attack
+            self._pending.append(sample)
+            self._pending_under_attack = under_attack
+            if len(self._pending) < self.batch_size and not attack_changed:
+                return
+            batch = self._pending
+            self._pending = []
+        self._publish_batch(batch)
+    
+    def _flush(self):
+        """Publish whatever samples are pending"""
+        with self._pending_lock:
+            batch = self._pending
+            self._pending = []
+        if batch:
+            self._publish_batch(batch)
+    
+    def _publish_batch(self, batch):
+        """Publish several encoded samples as one {'device_id', 'batch'} message"""
+        return self._publish_data(self._batch_prefix + b','.join(batch) + b']}')
+    
     def _publish_status(self, status):
         """Publish device status via MQTT"""
         if not self.connected and status != "offline":
             return False
             
         try:
-            payload = json.dumps({
+            payload = orjson.dumps({
                 'device_id': self.device_id,
                 'status': status,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_now()
             })
             result = self.client.publish(self.status_topic, payload, qos=1, retain=True)
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing status: {e}")
+            logger.error("Error publishing status: %s", e)
             return False
     
+    def _envelope(self, fields):
+        """Encode non-empty fields as a JSON object led by this device's pre-encoded device_id"""
+        return self._envelope_prefix + b',' + orjson.dumps(fields)[1:]
+    
     def _publish_security_alert(self, alert_type, details):
         """Publish security alert via MQTT"""
         if not self.connected:
             return False
             
         try:
-            payload = json.dumps({
-                'device_id': self.device_id,
-                'alert_type': alert_type,
-                'timestamp': datetime.now().isoformat(),
-                'details': details
-            })
+            payload = self._alert_tpl % (orjson.dumps(alert_type), iso_now().encode(), orjson.dumps(details))
             result = self.client.publish(self.security_topic, payload, qos=2)  # Use QoS 2 for security alerts
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing security alert: {e}")
+            logger.error("Error publishing security alert: %s", e)
             return False
     
     def _publish_keymap(self):
@@ -718,44 +1036,54 @@ class SimulatedGamingKeyboard:
             return False
             
         try:
-            # Create a heatmap-like representation of key usage
-            total_presses = sum(self.key_usage.values()) or 1  # Avoid division by zero
+            # Create a heatmap-like representation of key usage, over the keys pressed so far
+            pressed = np.flatnonzero(self.key_usage)
+            counts = self.key_usage[pressed]
+            total_presses = int(counts.sum())
             
             # Calculate percentage usage for each key and format for visualization
-            keymap_data = {}
-            for key, count in self.key_usage.items():
-                percentage = (count / total_presses) * 100
-                keymap_data[key] = round(percentage, 1)
+            percentages = np.round(counts * (100.0 / (total_presses or 1)), 1)  # Avoid division by zero
+            keymap_data = dict(zip(self._key_names[pressed].tolist(), percentages.tolist()))
             
-            payload = json.dumps({
-                'device_id': self.device_id,
-                'timestamp': datetime.now().isoformat(),
+            payload = self._envelope({
+                'timestamp': iso_now(),
                 'keymap': keymap_data,
-                'total_keypresses': sum(self.key_usage.values())
+                'total_keypresses': total_presses
             })
-            result = self.client.publish(self.keymap_topic, payload, qos=1)
+            # Each keymap supersedes the last, so QoS 0 is enough and skips the PUBACK round-trip
+            result = self.client.publish(self.keymap_topic, payload, qos=0)
             return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
-            print(f"Error publishing keymap data: {e}")
+            logger.error("Error publishing keymap data: %s", e)
             return False
     
     def _keymap_publisher(self):
-        """Thread that periodically publishes keymap data"""
-        while self.running:
-            try:
-                # Publish every 5 seconds
-                time.sleep(5)
-                self._publish_keymap()
-            except Exception as e:
-                print(f"Error in keymap publisher: {e}")
+        """Scheduled every max_delay_ms to publish keymap data if keys were pressed"""
+        if not self.running:
+            return
+        try:
+            # Idle keyboards have nothing new to report
+            if self._keymap_dirty_count and self._publish_keymap():
+                self._keymap_dirty_count = 0
+        except Exception as e:
+            logger.error("Error in keymap publisher: %s", e)
+        self._keymap_event = self._scheduler.enter(self.max_delay_ms / 1000, 1, self._keymap_publisher)
+    
+    def _keymap_publish_early(self):
+        """Publish the keymap now, restarting its max_delay_ms timer"""
+        try:
+            self._scheduler.cancel(self._keymap_event)
+        except ValueError:
+            pass  # Already ran
+        self._keymap_publisher()
     
     def _simulate_attack(self, duration=5):
         """Simulate an attack for a specific duration"""
         if not self.under_attack:
             self.under_attack = True
-            self.attack_start_time = time.time()
+            self.attack_start_time = time.monotonic()
             attack_intensity = random.randint(70, 100)
-            print(f"⚠️ ALERT: Keyboard is under attack! Detected {attack_intensity} suspicious events in 1 second")
+            logger.warning("⚠️ ALERT: Keyboard is under attack! Detected %s suspicious events in 1 second", attack_intensity)
             
             # Publish attack alert
             self._publish_security_alert('attack_detected', {
@@ -765,64 +1093,141 @@ class SimulatedGamingKeyboard:
             })
             
             # Schedule attack resolution after the specified duration
-            def resolve_attack():
-                time.sleep(duration)
-                if self.under_attack:
-                    attack_duration = self._get_attack_duration()
-                    self.under_attack = False
-                    self.attack_start_time = None
-                    print(f"✓ Attack stopped. Duration: {attack_duration} seconds")
-                    
-                    # Publish attack resolved alert
-                    self._publish_security_alert('attack_resolved', {
-                        'attack_type': 'key_injection',
-                        'duration': attack_duration
-                    })
-                    
-                    # Set cooldown to prevent immediate re-attack
-                    self.attack_cooldown = True
-                    self.attack_cooldown_until = time.time() + 10  # 10 second cooldown
-                
-            # Start thread to resolve attack after duration
-            attack_thread = threading.Thread(target=resolve_attack)
-            attack_thread.daemon = True
-            attack_thread.start()
-    
-    def _monitor_network(self):
-        """Simulated network monitoring for key injection attacks"""
-        while self.running:
-            try:
-                # Reset suspicious events counter every second
-                self.suspicious_events = 0
-                
-                # If in cooldown period, skip attack chance
-                if self.attack_cooldown and time.time() > self.attack_cooldown_until:
-                    self.attack_cooldown = False
-                
-                # For simulation purposes, occasionally simulate an attack
-                # 5% chance of simulated attack if not in cooldown and not already under attack
-                if not self.under_attack and not self.attack_cooldown and random.random() < 0.05:
-                    self._simulate_attack(random.randint(5, 10))  # Random duration between 5-10 seconds
-                    
-                # Sleep for a second to simulate the monitoring period
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error monitoring keyboard: {e}")
-                time.sleep(1)
+            self._scheduler.enter(duration, 1, self._resolve_attack)
+    
+    def _resolve_attack(self):
+        """Scheduled to end a simulated attack once its duration has passed"""
+        if self.under_attack:
+            attack_duration = self._get_attack_duration()
+            self.under_attack = False
+            self.attack_start_time = None
+            logger.info("✓ Attack stopped. Duration: %s seconds", attack_duration)
+            
+            # Publish attack resolved alert
+            self._publish_security_alert('attack_resolved', {
+                'attack_type': 'key_injection',
+                'duration': attack_duration
+            })
+            
+            # Set cooldown to prevent immediate re-attack; it is cleared by a scheduled event
+            self.attack_cooldown = True
+            self._scheduler.enter(self.attack_cooldown_seconds, 1, self._end_cooldown)
+    
+    def _end_cooldown(self):
+        """Scheduled to allow simulated attacks again once the cooldown has passed"""
+        self.attack_cooldown = False
+    
+    def _random_attack(self):
+        """Scheduled at exponentially distributed intervals to start a simulated attack"""
+        if not self.running:
+            return
+        try:
+            # For simulation purposes, occasionally simulate an attack if not in cooldown and not already under attack
+            if not self.under_attack and not self.attack_cooldown:
+                self._simulate_attack(random.randint(5, 10))  # Random duration between 5-10 seconds
+        except Exception as e:
+            logger.error("Error simulating attack: %s", e)
+        self._scheduler.enter(random.expovariate(SIMULATED_ATTACK_RATE), 1, self._random_attack)
+    
+    def _network_tick(self):
+        """Simulated network monitoring for key injection attacks, run with each data tick"""
+        # Reset suspicious events counter every tick
+        self.suspicious_events = 0
     
     def _run(self):
-        """Main execution loop"""
-        while self.running:
-            # Generate and publish performance data
+        """Main data tick, scheduled every send_interval seconds"""
+        if not self.running:
+            return
+        try:
+            self._network_tick()
+        except Exception as e:
+            logger.error("Error monitoring keyboard: %s", e)
+        try:
+            # Generate performance data; it is published in batches
             data = self._generate_performance_data()
-            self._publish_data(data)
-            
-            # Sleep for the specified interval
-            time.sleep(self.send_interval)
+            self._queue_data(data)
+        except Exception as e:
+            logger.error("Error generating data: %s", e)
+        if self._keymap_dirty_count >= self.max_messages:
+            self._keymap_publish_early()
+        self._scheduler.enter(self.send_interval, 1, self._run)
+
+
+def configure_logging():
+    """Send log records to stdout from a background listener, so device threads never block on console I/O"""
+    log_queue = queue.Queue(maxsize=10000)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    log_listener = QueueListener(log_queue, console_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(QueueHandler(log_queue))
+
+def connect_shared_client(broker, port, devices):
+    """Connect one MQTT client for several devices; returns None if the broker is unreachable
+    
+    The client keeps each started device's connected flag in step with the session, so
+    devices must be added to `devices` once they start.
+    """
+    client = mqtt.Client(client_id="simulated-devices")
+    client.max_inflight_messages_set(MAX_INFLIGHT_MESSAGES)
+    client.max_queued_messages_set(MAX_QUEUED_MESSAGES)
+    session_up = threading.Event()
+    
+    def on_connect(client, userdata, flags, rc):
+        if rc != 0:
+            logger.error("Failed to connect to MQTT broker with code: %s", rc)
+            return
+        logger.info("Connected to MQTT broker at %s:%s", broker, port)
+        
+        # Small telemetry messages shouldn't wait on Nagle's algorithm
+        sock = client.socket()
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        # Subscriptions and the retained status are re-sent after a reconnect; the devices
+        # subscribe themselves on start. Unwritten packets were discarded too, so stop waiting on them
+        for device in devices:
+            device._last_data_publish = None
+            if device.running:
+                device.connected = True
+                client.subscribe(device.control_topic)
+                device._publish_status("online")
+        session_up.set()
+    
+    def on_disconnect(client, userdata, rc):
+        logger.warning("Disconnected from MQTT broker with code: %s", rc)
+        for device in devices:
+            device.connected = False
+            device._last_data_publish = None
+    
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    try:
+        client.connect(broker, port, 60)
+        client.loop_start()
+    except Exception as e:
+        logger.error("Failed to connect to MQTT broker: %s", e)
+        return None
+    
+    # Devices publish their online status as they start, which needs the session to exist
+    if not session_up.wait(SHARED_CONNECT_TIMEOUT):
+        logger.error("No CONNACK from MQTT broker at %s:%s within %s seconds", broker, port, SHARED_CONNECT_TIMEOUT)
+        disconnect_shared_client(client)
+        return None
+    return client
 
+def disconnect_shared_client(client):
+    """Stop a client from connect_shared_client(), if one is in use"""
+    if client is not None:
+        client.loop_stop()
+        client.disconnect()
 
 def main():
+    configure_logging()
     parser = argparse.ArgumentParser(description='Simulated IoT Gaming Devices with MQTT')
     parser.add_argument('--type', default='mouse', choices=['mouse', 'keyboard', 'both'], help='Device type to simulate')
     parser.add_argument('--id', default=None, help='Device ID (optional, defaults to type-specific ID)')
@@ -833,6 +1238,13 @@ def main():
     
     devices = []
     
+    # Both devices multiplex their topics over one connection instead of opening one each
+    shared_client = None
+    if args.type == 'both':
+        shared_client = connect_shared_client(args.broker, args.port, devices)
+        if shared_client is None:
+            return 1
+    
     try:
         if args.type == 'mouse' or args.type == 'both':
             mouse_id = args.id if args.id and args.type == 'mouse' else 'mouse-001'
@@ -841,12 +1253,13 @@ def main():
                 mqtt_broker=args.broker,
                 mqtt_port=args.port,
                 mqtt_topic_prefix="iot/gaming/mouse",
-                send_interval=args.interval
+                send_interval=args.interval,
+                client=shared_client
             )
             if mouse.start():
                 devices.append(mouse)
             else:
-                print("Failed to start mouse simulation")
+                logger.error("Failed to start mouse simulation")
                 
         if args.type == 'keyboard' or args.type == 'both':
             keyboard_id = args.id if args.id and args.type == 'keyboard' else 'keyboard-001'
@@ -855,32 +1268,36 @@ def main():
                 mqtt_broker=args.broker,
                 mqtt_port=args.port,
                 mqtt_topic_prefix="iot/gaming/keyboard",
-                send_interval=args.interval
+                send_interval=args.interval,
+                client=shared_client
             )
             if keyboard.start():
                 devices.append(keyboard)
             else:
-                print("Failed to start keyboard simulation")
+                logger.error("Failed to start keyboard simulation")
         
         if not devices:
-            print("No devices were started. Exiting.")
+            logger.error("No devices were started. Exiting.")
+            disconnect_shared_client(shared_client)
             return 1
             
-        # Keep the main thread running
-        print(f"Running {len(devices)} simulated IoT gaming device(s)...")
-        while True:
-            try:
-                time.sleep(1)
-            except KeyboardInterrupt:
-                print("Stopping simulation...")
-                for device in devices:
-                    device.stop()
-                break
+        # Keep the main thread asleep until SIGINT or SIGTERM
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        logger.info("Running %s simulated IoT gaming device(s)...", len(devices))
+        stop_event.wait()
+        
+        logger.info("Stopping simulation...")
+        for device in devices:
+            device.stop()
+        disconnect_shared_client(shared_client)
                 
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error("Error: %s", e)
         for device in devices:
             device.stop()
+        disconnect_shared_client(shared_client)
         return 1
         
     return 0
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import threading
+
+import msgpack
+
+# Get logger
+logger = logging.getLogger('server')
+
+# Reject frames larger than this; device messages are a few hundred bytes
+MAX_FRAME_SIZE = 1024 * 1024
+
+def dispatch(app, payload):
+    """Route one decoded device message to the matching store"""
+    device_id = payload.get('device_id')
+    if not device_id:
+        logger.warning("Telemetry message without device_id dropped")
+        return
+
+    if 'event_type' in payload:
+        app.store_security_alert(device_id, payload['event_type'], payload.get('details'))
+    else:
+        app.store_iot_data(payload)
+
+async def handle_connection(app, reader, writer):
+    """Read 4-byte length-prefixed MessagePack frames until the device disconnects"""
+    peer = writer.get_extra_info('peername')
+    try:
+        while True:
+            header = await reader.readexactly(4)
+            size = int.from_bytes(header, 'big')
+            if size > MAX_FRAME_SIZE:
+                logger.warning(f"Telemetry frame of {size} bytes from {peer} rejected")
+                break
+
+            payload = msgpack.unpackb(await reader.readexactly(size), raw=False)
+            try:
+                dispatch(app, payload)
+            except Exception as e:
+                logger.error(f"Error processing telemetry from {peer}: {e}")
+    except asyncio.IncompleteReadError:
+        # Device closed the connection between or mid-frame
+        pass
+    except Exception as e:
+        logger.error(f"Telemetry connection error from {peer}: {e}")
+    finally:
+        writer.close()
+
+async def serve(app, host, port):
+    """Accept device connections forever"""
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(app, reader, writer), host, port)
+    logger.info(f"Telemetry listener running on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def _run_server(app, host, port):
+    """Thread target: run serve() and log why it stopped instead of dying silently"""
+    try:
+        asyncio.run(serve(app, host, port))
+    except OSError as e:
+        # Typically the port is already taken, e.g. by another worker process
+        logger.error(f"Telemetry listener could not bind {host}:{port}: {e}")
+    except Exception as e:
+        logger.error(f"Telemetry listener on {host}:{port} stopped: {e}")
+
+def start_telemetry_server(app, host='0.0.0.0', port=5001):
+    """Run the framed telemetry listener on its own event loop in a daemon thread"""
+    thread = threading.Thread(target=_run_server, args=(app, host, port))
+    thread.daemon = True
+    thread.start()
+    return thread
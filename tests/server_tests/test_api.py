@@ -0,0 +1,342 @@
+import hashlib
+import hmac
+import importlib
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import jwt
+import msgpack
+import numpy as np
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import app as server
+import config
+import routes.security
+import telemetry_tcp
+from app import app
+
+
+class IoTHeatmapTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        response = cls.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        cls.headers = {'Authorization': 'Bearer ' + response.get_json()['token']}
+
+    def get_heatmap(self, query=''):
+        # Pin the clock so both formats pick the same noise frame
+        with mock.patch.object(routes.security.time, 'time', return_value=1000.0):
+            return self.client.get('/api/metrics/iot_heatmap/mouse-001' + query, headers=self.headers)
+
+    def test_default_response_is_msgpack(self):
+        response = self.get_heatmap()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/msgpack')
+
+        data = msgpack.unpackb(response.data, raw=False)
+        height, width = data['resolution']['height'], data['resolution']['width']
+        self.assertEqual(data['dtype'], 'u1')
+        self.assertEqual(len(data['position_heatmap']), height * width)
+        self.assertEqual(len(data['click_heatmap']), height * width)
+
+    def test_json_fallback_matches_msgpack(self):
+        packed = msgpack.unpackb(self.get_heatmap().data, raw=False)
+        response = self.get_heatmap('?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/json')
+
+        data = response.get_json()
+        height, width = data['resolution']['height'], data['resolution']['width']
+        self.assertEqual(data['device_id'], 'mouse-001')
+        for key in ('position_heatmap', 'click_heatmap'):
+            grid = np.array(data[key])
+            self.assertEqual(grid.shape, (height, width))
+            self.assertLessEqual(grid.max(), 100)
+            expected = np.frombuffer(packed[key], dtype=np.uint8).reshape(height, width)
+            np.testing.assert_array_equal(grid, expected)
+
+    def test_requires_auth(self):
+        response = self.client.get('/api/metrics/iot_heatmap/mouse-001?format=json')
+        self.assertEqual(response.status_code, 401)
+
+
+class JWTCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        server._jwt_cache.clear()
+
+    def make_token(self, key=None, **claims):
+        now = int(time.time())
+        payload = {'sub': 'admin', 'role': 'admin', 'iat': now, 'exp': now + 3600}
+        payload.update(claims)
+        payload = {k: v for k, v in payload.items() if v is not None}
+        return jwt.encode(payload, key or app.config['JWT_KEY'], algorithm='HS256')
+
+    def verify(self, token):
+        return self.client.get('/api/auth/verify', headers={'Authorization': 'Bearer ' + token})
+
+    def test_valid_token_is_cached_until_its_exp(self):
+        exp = int(time.time()) + 30
+        token = self.make_token(exp=exp)
+        self.assertEqual(self.verify(token).status_code, 200)
+        # Capped at the token's own exp rather than a full JWT_CACHE_TTL
+        self.assertEqual(server._jwt_cache[token][1], exp)
+
+    def test_cached_token_stops_authenticating_after_exp(self):
+        exp = int(time.time()) + 1
+        token = self.make_token(exp=exp)
+        self.assertEqual(self.verify(token).status_code, 200)
+        self.assertIn(token, server._jwt_cache)
+
+        time.sleep(max(0, exp - time.time()) + 0.1)
+        response = self.verify(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.get_json()['error'], 'Token expired')
+
+    def test_token_missing_required_claims_is_rejected(self):
+        for claim in ('iat', 'sub'):
+            with self.subTest(missing=claim):
+                token = self.make_token(**{claim: None})
+                self.assertEqual(self.verify(token).status_code, 401)
+                self.assertNotIn(token, server._jwt_cache)
+
+    def test_failed_decode_is_not_cached(self):
+        token = self.make_token(key='not-the-server-key-but-just-as-long')
+        self.assertEqual(self.verify(token).status_code, 401)
+        self.assertNotIn(token, server._jwt_cache)
+
+        # A second attempt is verified again rather than served from the cache
+        with mock.patch.object(server.jwt, 'decode', wraps=jwt.decode) as decode:
+            self.assertEqual(self.verify(token).status_code, 401)
+        decode.assert_called_once()
+
+    def test_protected_route_uses_the_same_checks(self):
+        token = self.make_token(sub=None)
+        response = self.client.get('/api/devices', headers={'Authorization': 'Bearer ' + token})
+        self.assertEqual(response.status_code, 401)
+
+
+class LoginCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        server._login_cache.clear()
+        server.users['cache-user'] = {'password': generate_password_hash('right'), 'role': 'user'}
+        self.addCleanup(server.users.pop, 'cache-user', None)
+        self.addCleanup(server._login_cache.clear)
+
+    def login(self, password):
+        return self.client.post('/api/auth/login', json={'username': 'cache-user', 'password': password})
+
+    def count_hash_checks(self):
+        return mock.patch.object(server, 'check_password_hash', wraps=check_password_hash)
+
+    def test_repeat_login_skips_the_hash_check(self):
+        with self.count_hash_checks() as check:
+            self.assertEqual(self.login('right').status_code, 200)
+            self.assertEqual(self.login('right').status_code, 200)
+        self.assertEqual(check.call_count, 1)
+
+    def test_wrong_password_after_cached_success_is_rejected(self):
+        self.assertEqual(self.login('right').status_code, 200)
+        self.assertEqual(self.login('wrong').status_code, 401)
+        # The failure didn't evict or replace the cached success
+        self.assertEqual(self.login('right').status_code, 200)
+
+    def test_changed_stored_hash_invalidates_the_entry(self):
+        self.assertEqual(self.login('right').status_code, 200)
+        server.users['cache-user']['password'] = generate_password_hash('new')
+
+        self.assertEqual(self.login('right').status_code, 401)
+        self.assertEqual(self.login('new').status_code, 200)
+
+    def test_failed_check_is_not_cached(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertNotIn('cache-user', server._login_cache)
+
+    def test_disabled_cache_checks_every_login(self):
+        with mock.patch.dict(app.config, {'AUTH_CACHE_ENABLED': False}):
+            with self.count_hash_checks() as check:
+                self.assertEqual(self.login('right').status_code, 200)
+                self.assertEqual(self.login('right').status_code, 200)
+        self.assertEqual(check.call_count, 2)
+        self.assertNotIn('cache-user', server._login_cache)
+
+
+class FlaskResponse:
+    """The parts of a requests.Response that SecureSender reads, over a test client response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.text = response.get_data(as_text=True)
+        self._json = response.get_json(silent=True)
+
+    def json(self):
+        return self._json
+
+
+class SecureSenderSignatureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.sent = []
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+
+        # config.py carries no agent settings in this tree; supply the ones secure_sender reads
+        settings = mock.patch.multiple(config, create=True, LOG_FILE=os.devnull, DATA_DIR=data_dir.name,
+                                       TLS_VERIFY=True, DEVICE_TYPE='mouse', DEVICE_NAME='Test Mouse')
+        settings.start()
+        self.addCleanup(settings.stop)
+        self.secure_sender = importlib.import_module('secure_sender')
+
+        # Route the sender's HTTP calls into the Flask app, keeping the exact bytes and headers
+        post = mock.patch.object(self.secure_sender.requests, 'post', side_effect=self.post)
+        post.start()
+        self.addCleanup(post.stop)
+
+    def post(self, url, json=None, data=None, headers=None, timeout=None, verify=None):
+        self.sent.append((url, data, headers))
+        path = url.split('//', 1)[-1].partition('/')[2]
+        return FlaskResponse(self.client.post('/' + path, json=json, data=data, headers=headers))
+
+    def test_signed_upload_round_trip(self):
+        sender = self.secure_sender.SecureSender('http://server', 'device_1', 'secret_1')
+        response = sender.send_data(b'\x00encrypted\xff')
+
+        self.assertIsNotNone(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.metrics['device_1'][-1]['encrypted_data'], b'\x00encrypted\xff')
+
+    def test_tampered_upload_is_rejected(self):
+        sender = self.secure_sender.SecureSender('http://server', 'device_1', 'secret_1')
+        self.assertIsNotNone(sender.send_data(b'payload'))
+        url, body, headers = self.sent[-1]
+
+        # Same signature, one byte of the signed body changed
+        tampered = body.replace(b'device_1', b'device_2')
+        response = self.client.post('/api/metrics/upload', data=tampered, headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_missing_client_id_is_rejected(self):
+        sender = self.secure_sender.SecureSender('http://server', 'device_1', 'secret_1')
+        self.assertIsNotNone(sender.send_data(b'payload'))
+        url, body, headers = self.sent[-1]
+
+        headers = {k: v for k, v in headers.items() if k != 'X-Client-ID'}
+        response = self.client.post('/api/metrics/upload', data=body, headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class RawUploadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        response = cls.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        cls.token = response.get_json()['token']
+
+    def upload(self, body, client_id='device_1', signature=None, secret='secret_1'):
+        if signature is None:
+            signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        headers = {
+            'Authorization': 'Bearer ' + self.token,
+            'Content-Type': 'application/octet-stream',
+            'X-Request-Signature': signature
+        }
+        if client_id is not None:
+            headers['X-Client-ID'] = client_id
+        return self.client.post('/api/metrics/upload_raw', data=body, headers=headers)
+
+    def test_signed_raw_body_is_stored_as_is(self):
+        body = bytes(range(256))
+        response = self.upload(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.metrics['device_1'][-1]['encrypted_data'], body)
+
+    def test_tampered_body_is_rejected(self):
+        signature = hmac.new(b'secret_1', b'\x00\x01original', hashlib.sha256).hexdigest()
+        self.assertEqual(self.upload(b'\x00\x01tampered', signature=signature).status_code, 401)
+
+    def test_missing_client_id_is_rejected(self):
+        self.assertEqual(self.upload(b'\x00\x01raw', client_id=None).status_code, 401)
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.upload(b'\x00\x01raw', secret='not_secret_1').status_code, 401)
+        self.assertEqual(self.upload(b'\x00\x01raw', signature='0' * 64).status_code, 401)
+
+    def test_requires_bearer_token(self):
+        body = b'\x00\x01raw'
+        response = self.client.post('/api/metrics/upload_raw', data=body, headers={
+            'Content-Type': 'application/octet-stream',
+            'X-Client-ID': 'device_1',
+            'X-Request-Signature': hmac.new(b'secret_1', body, hashlib.sha256).hexdigest()
+        })
+        self.assertEqual(response.status_code, 401)
+
+
+class TelemetryDeltaMergeTest(unittest.TestCase):
+
+    SNAPSHOT = {
+        'device_id': 'mouse-delta', 'device_type': 'mouse', 'ts': 1000,
+        'delta': {'input_rate': 120, 'response_time': 2.5, 'error_rate': 0.1,
+                  'battery_level': 99.9, 'connection_quality': 100}
+    }
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.addCleanup(app.iot_data.pop, 'mouse-delta', None)
+
+    def post_msgpack(self, message):
+        response = self.client.post('/api/metrics/iot_data', data=msgpack.packb(message, use_bin_type=True),
+                                    content_type='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+
+    def check_snapshot_then_delta(self, send):
+        send(self.SNAPSHOT)
+        send({'device_id': 'mouse-delta', 'device_type': 'mouse', 'ts': 2000, 'delta': {'input_rate': 77}})
+
+        first, merged = app.iot_data['mouse-delta']
+        self.assertEqual(first['metrics'], self.SNAPSHOT['delta'])
+        self.assertEqual(merged, {
+            'device_id': 'mouse-delta',
+            'device_type': 'mouse',
+            'ts': 2000,
+            'metrics': {**self.SNAPSHOT['delta'], 'input_rate': 77}
+        })
+
+    def test_msgpack_http_snapshot_then_delta(self):
+        self.check_snapshot_then_delta(self.post_msgpack)
+
+    def test_tcp_dispatch_snapshot_then_delta(self):
+        self.check_snapshot_then_delta(lambda message: telemetry_tcp.dispatch(app, message))
+
+    def test_delta_without_prior_snapshot(self):
+        telemetry_tcp.dispatch(app, {'device_id': 'mouse-delta', 'device_type': 'mouse', 'ts': 5,
+                                     'delta': {'input_rate': 77}})
+
+        record, = app.iot_data['mouse-delta']
+        self.assertEqual(record['metrics'], {'input_rate': 77})
+        self.assertEqual(record['device_type'], 'mouse')
+
+    def test_missing_fields_fall_back(self):
+        self.post_msgpack(self.SNAPSHOT)
+        before = time.time_ns()
+        # No device_type or ts on the frame: the type carries over and the receive time is used
+        self.post_msgpack({'device_id': 'mouse-delta', 'delta': {'error_rate': 0.2}})
+        after = time.time_ns()
+
+        merged = app.iot_data['mouse-delta'][-1]
+        self.assertEqual(merged['device_type'], 'mouse')
+        self.assertTrue(before <= merged['ts'] <= after)
+        self.assertEqual(merged['metrics']['error_rate'], 0.2)
+        self.assertEqual(merged['metrics']['input_rate'], 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
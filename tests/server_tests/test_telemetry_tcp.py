@@ -0,0 +1,82 @@
+import asyncio
+import struct
+import unittest
+
+import msgpack
+
+import telemetry_tcp
+
+
+class RecordingApp:
+    """Stands in for the Flask app, recording what dispatch() stores"""
+
+    def __init__(self):
+        self.data = []
+        self.alerts = []
+
+    def store_iot_data(self, payload):
+        self.data.append(payload)
+
+    def store_security_alert(self, device_id, event_type, details):
+        self.alerts.append((device_id, event_type, details))
+
+
+def frame(message):
+    """Encode one message the way the device simulator sends it"""
+    payload = msgpack.packb(message, use_bin_type=True)
+    return struct.pack('>I', len(payload)) + payload
+
+
+class TelemetryFramingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.app = RecordingApp()
+        self.server = await asyncio.start_server(
+            lambda reader, writer: telemetry_tcp.handle_connection(self.app, reader, writer),
+            '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def send(self, data):
+        """Write raw bytes on a fresh connection and wait for the server to close it"""
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(data)
+        await writer.drain()
+        writer.write_eof()
+        await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_frames_round_trip_to_stores(self):
+        metrics = {'device_id': 'mouse-5556', 'device_type': 'mouse', 'ts': 1, 'delta': {'input_rate': 77}}
+        attack = {'device_id': 'mouse-5556', 'event_type': 'attack_detected', 'details': {'packets': 101, 'window_s': 0.5}}
+
+        # Two frames back to back on one connection
+        await self.send(frame(metrics) + frame(attack))
+
+        self.assertEqual(self.app.data, [metrics])
+        self.assertEqual(self.app.alerts, [('mouse-5556', 'attack_detected', {'packets': 101, 'window_s': 0.5})])
+
+    async def test_message_without_device_id_is_dropped(self):
+        await self.send(frame({'delta': {'input_rate': 1}}) + frame({'device_id': 'kb-1', 'delta': {}}))
+
+        self.assertEqual(self.app.data, [{'device_id': 'kb-1', 'delta': {}}])
+        self.assertEqual(self.app.alerts, [])
+
+    async def test_oversized_frame_closes_connection(self):
+        header = struct.pack('>I', telemetry_tcp.MAX_FRAME_SIZE + 1)
+        await self.send(header + frame({'device_id': 'kb-1', 'delta': {}}))
+
+        self.assertEqual(self.app.data, [])
+
+    async def test_truncated_frame_is_ignored(self):
+        await self.send(frame({'device_id': 'kb-1', 'delta': {}})[:-2])
+
+        self.assertEqual(self.app.data, [])
+
+
+if __name__ == '__main__':
+    unittest.main()